@@ -0,0 +1,147 @@
+"""Time each step of the bump pipeline against synthetic repositories.
+
+Each scenario describes a repository (number of files, occurrences
+of the version per file, glob-heavy config, large files ...). The
+repository is generated once, and each step is timed separately, for
+several runs. Results are written as JSON, so that they can be compared
+between tbump releases.
+
+Usage:
+    python -m benchmarks.bench_bump [--scenario NAME ...] [--runs 5]
+                                    [--output results.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+import cli_ui as ui
+
+from benchmarks.synthetic import NEW_VERSION, SCENARIOS, Scenario, generate, reset
+from tbump.cli import TBUMP_VERSION
+from tbump.config import get_config_file
+from tbump.executor import Executor
+from tbump.file_bumper import FileBumper
+from tbump.git_bumper import GitBumper, GitBumperOptions
+
+T = TypeVar("T")
+
+STEPS = [
+    "get_config_file",
+    "check_files_exist",
+    "get_patches",
+    "executor_run",
+    "git_checks",
+]
+
+
+class Timer:
+    def __init__(self) -> None:
+        self.timings: Dict[str, List[float]] = {step: [] for step in STEPS}
+
+    def measure(self, step: str, func: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        res = func()
+        self.timings[step].append(time.perf_counter() - start)
+        return res
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            step: {
+                "min": min(runs),
+                "median": statistics.median(runs),
+                "max": max(runs),
+                "runs": runs,
+            }
+            for step, runs in self.timings.items()
+        }
+
+
+def run_once(repo_path: Path, timer: Timer) -> None:
+    config_file = timer.measure("get_config_file", lambda: get_config_file(repo_path))
+    config = config_file.get_config()
+
+    file_bumper = FileBumper(repo_path, config)
+    timer.measure("check_files_exist", file_bumper.check_files_exist)
+    timer.measure("get_patches", lambda: file_bumper.get_patches(NEW_VERSION))
+
+    operations = ["patch", "commit", "tag", "push_commit", "push_tag"]
+    git_bumper = GitBumper(GitBumperOptions(working_path=repo_path), operations)
+    git_bumper.set_config(config)
+
+    def git_checks() -> None:
+        git_bumper.check_dirty()
+        git_bumper.check_branch_state(NEW_VERSION)
+
+    timer.measure("git_checks", git_checks)
+
+    # Note: the executor computes its own patches, and only patches files
+    # here, so that the timings do not depend on the speed of the remote
+    config_file.set_new_version(NEW_VERSION)
+    executor = Executor(NEW_VERSION, FileBumper(repo_path, config), config_file)
+    with quiet():
+        timer.measure("executor_run", executor.run)
+
+
+@contextmanager
+def quiet() -> Iterator[None]:
+    """Silence cli_ui while running the executor"""
+    ui.CONFIG["quiet"] = True
+    try:
+        yield
+    finally:
+        ui.CONFIG["quiet"] = False
+
+
+def run_scenario(scenario: Scenario, runs: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="tbump-bench-") as tmp:
+        repo_path = generate(Path(tmp), scenario)
+        timer = Timer()
+        for _ in range(runs):
+            run_once(repo_path, timer)
+            reset(repo_path)
+    return {"params": scenario.to_dict(), "timings": timer.summary()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=[x.name for x in SCENARIOS],
+        help="Scenario to run (can be repeated). Default: all",
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="Write JSON results here")
+    args = parser.parse_args()
+
+    names = args.scenario or [x.name for x in SCENARIOS]
+    results: Dict[str, Any] = {
+        "tbump_version": TBUMP_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "scenarios": {},
+    }
+    for scenario in SCENARIOS:
+        if scenario.name not in names:
+            continue
+        print(f"Running {scenario.name} ...", file=sys.stderr)
+        results["scenarios"][scenario.name] = run_scenario(scenario, args.runs)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
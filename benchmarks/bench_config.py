@@ -0,0 +1,98 @@
+"""Measure how long it takes to validate and load a config, many times in a row.
+
+This is what happens when tbump is used as a library to read the config
+of many projects. The config is parsed once with tomlkit, then validated
+`--loads` times:
+
+* `rebuild-schema`: by building the schema validators before each
+  validation, as tbump used to do
+* `validate`: by using `validate_basic_schema()`, which reuses the same
+  validators
+* `from-parsed-config`: by building a whole Config instance, which also
+  runs the second pass of validation
+
+Usage:
+    python -m benchmarks.bench_config [--loads 1000] [--runs 5]
+                                      [--output results.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+import tomlkit
+
+from benchmarks.synthetic import Scenario, make_config
+from tbump.cli import TBUMP_VERSION
+from tbump.config import build_basic_schema, from_parsed_config, validate_basic_schema
+
+SCENARIO = Scenario("config", files=20, occurrences=1, use_search=True)
+
+HOOKS = """
+[[before_commit]]
+name = "check changelog"
+cmd = "grep -q {new_version} Changelog.rst"
+
+[[after_push]]
+name = "publish"
+cmd = "./publish.sh"
+"""
+
+
+def get_parsed() -> Dict[str, Any]:
+    doc = tomlkit.loads(make_config(SCENARIO) + HOOKS)
+    return doc.value
+
+
+def measure(func: Callable[[], Any], *, loads: int, runs: int) -> Dict[str, Any]:
+    timings: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(loads):
+            func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "runs": timings,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loads", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write JSON results here")
+    args = parser.parse_args()
+
+    parsed = get_parsed()
+    cases: Dict[str, Callable[[], Any]] = {
+        "rebuild-schema": lambda: build_basic_schema().validate(parsed),
+        "validate": lambda: validate_basic_schema(parsed),
+        "from-parsed-config": lambda: from_parsed_config(parsed),
+    }
+    results: Dict[str, Any] = {
+        "tbump_version": TBUMP_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "loads": args.loads,
+        "runs": args.runs,
+        "cases": {},
+    }
+    for name, func in cases.items():
+        results["cases"][name] = measure(func, loads=args.loads, runs=args.runs)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
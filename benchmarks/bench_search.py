@@ -0,0 +1,80 @@
+"""Measure the per-line cost of checking `search` patterns.
+
+Compares passing the raw patterns to `should_replace()`, which goes
+through the cache of the `re` module, with passing the patterns
+pre-compiled by `ChangeRequest`.
+
+Usage:
+    python -m benchmarks.bench_search [--patterns 50] [--lines 20000]
+"""
+
+import argparse
+import re
+import time
+from typing import Callable, List
+
+from tbump.file_bumper import ChangeRequest, should_replace
+
+VERSION = "1.2.3"
+
+
+def make_lines(count: int) -> List[str]:
+    res = []
+    for i in range(count):
+        if i % 10 == 0:
+            res.append(f'  "package-{i}": "{VERSION}",')
+        else:
+            res.append(f"  some_code_{i} = compute({i}, {i + 1})")
+    return res
+
+
+def make_change_requests(count: int) -> List[ChangeRequest]:
+    res = []
+    for i in range(count):
+        search = f'"package-{i * 10}": "{{current_version}}"'
+        search = search.format(current_version=re.escape(VERSION))
+        res.append(ChangeRequest("package.json", VERSION, "1.2.4", search=search))
+    return res
+
+
+def time_per_line(func: Callable[[str], None], lines: List[str]) -> float:
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    return (time.perf_counter() - start) / len(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patterns", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=20_000)
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    change_requests = make_change_requests(args.patterns)
+
+    def with_raw_patterns(line: str) -> None:
+        for change_request in change_requests:
+            should_replace(line, change_request.old_string, change_request.search)
+
+    def with_compiled_patterns(line: str) -> None:
+        for change_request in change_requests:
+            should_replace(line, change_request.old_string, change_request.search_regex)
+
+    def regex_only(line: str) -> None:
+        for change_request in change_requests:
+            assert change_request.search
+            re.search(change_request.search, line)
+
+    print(f"{args.patterns} search patterns, {args.lines} lines")
+    for name, func in [
+        ("re.search() on every line", regex_only),
+        ("raw patterns", with_raw_patterns),
+        ("compiled patterns", with_compiled_patterns),
+    ]:
+        cost = time_per_line(func, lines)
+        print(f"{name:>30}: {cost * 1e6:8.2f} µs/line")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Measure how long each tbump command takes to start.
+
+Each command is run in a fresh interpreter, against a small synthetic
+repository: once with `python -X importtime`, to find out which modules
+are imported and how long they take, and several times without it, to
+measure the wall-clock time of the whole command.
+
+Usage:
+    python -m benchmarks.bench_startup [--command NAME ...] [--runs 10]
+                                       [--top 10] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.synthetic import NEW_VERSION, Scenario, generate
+from tbump.cli import TBUMP_VERSION
+
+COMMANDS = {
+    "version": ["--version"],
+    "help": ["--help"],
+    "current-version": ["current-version"],
+    "dry-run": ["--dry-run", "--non-interactive", NEW_VERSION],
+}
+
+SCENARIO = Scenario("startup", files=5, occurrences=1)
+
+# (module, self time, cumulative time), in microseconds
+ImportTime = Tuple[str, int, int]
+
+
+def get_tbump_cmd(repo_path: Path, args: List[str]) -> List[str]:
+    return [sys.executable, "-m", "tbump", "-C", str(repo_path), *args]
+
+
+def get_env() -> Dict[str, str]:
+    # Make sure the checked-out sources are used
+    root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    return env
+
+
+def parse_import_times(stderr: str) -> List[ImportTime]:
+    res = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # import time: <self> | <cumulative> | <indented module name>
+        header, cumulative, name = line.split("|")
+        self_time = header.split(":")[1]
+        res.append((name.strip(), int(self_time), int(cumulative)))
+    return res
+
+
+def measure_imports(repo_path: Path, args: List[str]) -> List[ImportTime]:
+    cmd = [sys.executable, "-X", "importtime", *get_tbump_cmd(repo_path, args)[1:]]
+    process = subprocess.run(cmd, env=get_env(), capture_output=True, text=True)
+    return parse_import_times(process.stderr)
+
+
+def measure_wall_time(repo_path: Path, args: List[str], runs: int) -> List[float]:
+    res = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            get_tbump_cmd(repo_path, args),
+            env=get_env(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        res.append(time.perf_counter() - start)
+    return res
+
+
+def run_command(
+    repo_path: Path, args: List[str], *, runs: int, top: int
+) -> Dict[str, Any]:
+    import_times = measure_imports(repo_path, args)
+    # self times add up to the total time spent importing
+    total_us = sum(x[1] for x in import_times)
+    slowest = sorted(import_times, key=lambda x: x[2], reverse=True)[:top]
+    wall_times = measure_wall_time(repo_path, args, runs)
+    return {
+        "args": args,
+        "modules_imported": len(import_times),
+        "import_time": total_us / 1_000_000,
+        "slowest_imports": [
+            {"module": name, "self": self_us / 1_000_000, "cumulative": cum / 1_000_000}
+            for name, self_us, cum in slowest
+        ],
+        "wall_time": {
+            "min": min(wall_times),
+            "median": statistics.median(wall_times),
+            "max": max(wall_times),
+            "runs": wall_times,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--command",
+        action="append",
+        choices=list(COMMANDS),
+        help="Command to measure (can be repeated). Default: all",
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of slowest imports to report"
+    )
+    parser.add_argument("--output", type=Path, help="Write JSON results here")
+    args = parser.parse_args()
+
+    names = args.command or list(COMMANDS)
+    results: Dict[str, Any] = {
+        "tbump_version": TBUMP_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "commands": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="tbump-bench-") as tmp:
+        repo_path = generate(Path(tmp), SCENARIO)
+        for name in names:
+            print(f"Running {name} ...", file=sys.stderr)
+            results["commands"][name] = run_command(
+                repo_path, COMMANDS[name], runs=args.runs, top=args.top
+            )
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Generate synthetic repositories to benchmark tbump against"""
+
+import textwrap
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+from tbump.git import run_git_captured
+
+CURRENT_VERSION = "1.2.3"
+NEW_VERSION = "1.2.4"
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Number of files to patch
+    files: int
+    # Number of lines containing the version in each file
+    occurrences: int
+    # Number of lines that do not contain the version in each file
+    filler_lines: int = 10
+    # Use one `**` pattern instead of one [[file]] entry per file
+    use_globs: bool = False
+    # Files created next to the ones to patch, but not matching any pattern
+    unrelated_files: int = 0
+    # Use a `search` pattern for each file
+    use_search: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+SCENARIOS = [
+    Scenario("many-files", files=200, occurrences=2),
+    Scenario("many-occurrences", files=1, occurrences=400, filler_lines=4000),
+    Scenario("globs", files=200, occurrences=2, use_globs=True, unrelated_files=2000),
+    Scenario("search", files=50, occurrences=20, use_search=True),
+    Scenario("large-file", files=1, occurrences=100, filler_lines=2_000_000),
+]
+
+
+def get_scenario(name: str) -> Scenario:
+    for scenario in SCENARIOS:
+        if scenario.name == name:
+            return scenario
+    raise KeyError(name)
+
+
+def make_config(scenario: Scenario) -> str:
+    res = textwrap.dedent(
+        f"""\
+        [version]
+        current = "{CURRENT_VERSION}"
+        regex = '''
+          (?P<major>\\d+)
+          \\.
+          (?P<minor>\\d+)
+          \\.
+          (?P<patch>\\d+)
+          '''
+
+        [git]
+        message_template = "Bump to {{new_version}}"
+        tag_template = "v{{new_version}}"
+        """
+    )
+    search = 'version = "{current_version}"'
+    if scenario.use_globs:
+        res += '\n[[file]]\nsrc = "packages/**/version.txt"\n'
+        if scenario.use_search:
+            res += f"search = '{search}'\n"
+        return res
+    for src in get_sources(scenario):
+        res += f'\n[[file]]\nsrc = "{src}"\n'
+        if scenario.use_search:
+            res += f"search = '{search}'\n"
+    return res
+
+
+def get_sources(scenario: Scenario) -> List[str]:
+    return [f"packages/pkg-{i}/src/version.txt" for i in range(scenario.files)]
+
+
+def make_contents(scenario: Scenario) -> str:
+    lines = []
+    step = max(scenario.filler_lines // max(scenario.occurrences, 1), 1)
+    occurrences = 0
+    for i in range(scenario.filler_lines + scenario.occurrences):
+        if occurrences < scenario.occurrences and i % (step + 1) == 0:
+            lines.append(f'version = "{CURRENT_VERSION}"')
+            occurrences += 1
+        else:
+            lines.append(f"some_code_{i} = compute({i}, {i + 1})")
+    return "\n".join(lines) + "\n"
+
+
+def generate(path: Path, scenario: Scenario) -> Path:
+    """Generate a git repository for the given scenario in `path`, with an
+    upstream branch, so that all the git checks can run.
+
+    Return the path of the working copy
+    """
+    repo_path = path / "repo"
+    remote_path = path / "remote.git"
+    repo_path.mkdir(parents=True)
+    remote_path.mkdir(parents=True)
+
+    (repo_path / "tbump.toml").write_text(make_config(scenario))
+    contents = make_contents(scenario)
+    for src in get_sources(scenario):
+        file_path = repo_path / src
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(contents)
+    for i in range(scenario.unrelated_files):
+        file_path = repo_path / "packages" / f"other-{i % 20}" / f"file-{i}.txt"
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text("nothing to see here\n")
+
+    run_git_captured(remote_path, "init", "--bare", "--initial-branch", "master")
+    run_git_captured(repo_path, "init", "--initial-branch", "master")
+    run_git_captured(repo_path, "add", ".")
+    run_git_captured(repo_path, "commit", "--message", "initial commit")
+    run_git_captured(repo_path, "remote", "add", "origin", str(remote_path))
+    run_git_captured(repo_path, "push", "--set-upstream", "origin", "master")
+    return repo_path
+
+
+def reset(repo_path: Path) -> None:
+    """Undo the changes made by a bump"""
+    run_git_captured(repo_path, "reset", "--hard", "--quiet")
@@ -55,3 +55,30 @@ def test(c):
 )
 def lint(c):
     pass
+
+
+@task
+def bench(c, runs=5, output=None):
+    print("Running benchmarks")
+    cmd = f"python -m benchmarks.bench_bump --runs {runs}"
+    if output:
+        cmd += f" --output {output}"
+    c.run(cmd)
+
+
+@task
+def bench_startup(c, runs=10, output=None):
+    print("Running startup benchmarks")
+    cmd = f"python -m benchmarks.bench_startup --runs {runs}"
+    if output:
+        cmd += f" --output {output}"
+    c.run(cmd)
+
+
+@task
+def bench_config(c, loads=1000, runs=5, output=None):
+    print("Running config benchmarks")
+    cmd = f"python -m benchmarks.bench_config --loads {loads} --runs {runs}"
+    if output:
+        cmd += f" --output {output}"
+    c.run(cmd)
@@ -1 +1,16 @@
-from tbump.file_bumper import bump_files  # noqa: F401
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from tbump.file_bumper import bump_files
+
+__all__ = ["bump_files"]
+
+
+def __getattr__(name: str) -> Any:
+    # Importing the package must stay cheap: the CLI imports it for every
+    # command, so bump_files() is only loaded when it is used
+    if name == "bump_files":
+        from tbump.file_bumper import bump_files
+
+        return bump_files
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,176 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import cli_ui as ui
+
+from tbump.config import Config, ConfigFileUpdater, get_config_file
+from tbump.error import Error
+from tbump.executor import Executor
+from tbump.file_bumper import FileBumper, Patch, ScanJob, run_scan_jobs
+from tbump.git import run_git_captured
+from tbump.timings import PATCHES, count, phase
+
+CONFIG_FILE_NAME = "tbump.toml"
+
+# Never looked into when looking for projects outside a git repository,
+# along with hidden directories
+DISCOVERY_IGNORED_DIRS = ["__pycache__", "node_modules", "site-packages", "venv"]
+
+H = TypeVar("H", bound=Hashable)
+
+
+class NoProjectsFound(Error):
+    def __init__(self, root: Path):
+        super().__init__()
+        self.root = root
+
+    def print_error(self) -> None:
+        ui.error("No", CONFIG_FILE_NAME, "file found below", self.root)
+
+
+@dataclass
+class Project:
+    """One of the projects bumped in batch mode, with its own config file"""
+
+    path: Path
+    config_file: ConfigFileUpdater
+    config: Config
+    file_bumper: FileBumper
+
+
+def discover_projects(root: Path) -> List[Path]:
+    """Return every directory below `root` containing a tbump.toml file.
+
+    Inside a git repository, only the files known to git (tracked or not
+    ignored) are considered. Otherwise, hidden directories and the usual
+    build and dependency directories are skipped.
+    """
+    rc, out = run_git_captured(
+        root,
+        "ls-files",
+        "-z",
+        "--cached",
+        "--others",
+        "--exclude-standard",
+        "--",
+        "*" + CONFIG_FILE_NAME,
+        check=False,
+    )
+    if rc == 0:
+        names = {x for x in out.split("\0") if x}
+        res = sorted(
+            (root / x).parent
+            for x in names
+            if os.path.basename(x) == CONFIG_FILE_NAME and (root / x).is_file()
+        )
+    else:
+        res = list(walk_projects(root))
+    if not res:
+        raise NoProjectsFound(root)
+    return res
+
+
+def walk_projects(root: Path) -> Iterator[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            x
+            for x in dirnames
+            if not x.startswith(".") and x not in DISCOVERY_IGNORED_DIRS
+        )
+        if CONFIG_FILE_NAME in filenames:
+            yield Path(dirpath)
+
+
+def load_projects(
+    working_path: Path, project_paths: Sequence[Path], *, jobs: Optional[int] = None
+) -> List[Project]:
+    """Load the config of each project.
+
+    Relative paths are relative to the working path. When no path is
+    given, look for every project below the working path.
+    """
+    if not project_paths:
+        project_paths = discover_projects(working_path)
+    res = []
+    for project_path in unique(working_path / x for x in project_paths):
+        config_file = get_config_file(project_path)
+        config = config_file.get_config()
+        file_bumper = FileBumper(project_path, config, jobs=jobs)
+        res.append(Project(project_path, config_file, config, file_bumper))
+    return res
+
+
+def get_all_patches(
+    projects: Sequence[Project], new_version: str, *, jobs: int
+) -> List[Patch]:
+    """Compute the patches of all the projects, scanning every file
+    in the same pool of threads
+    """
+    with phase("scan files"):
+        plans = [x.file_bumper.plan_patches(new_version) for x in projects]
+        scan_jobs: List[Tuple[FileBumper, ScanJob]] = []
+        for project, plan in zip(projects, plans):
+            scan_jobs.extend((project.file_bumper, x) for x in plan.scan_jobs)
+
+        results = run_scan_jobs(
+            scan_jobs, lambda job: job[0].scan_job(job[1]), jobs=jobs
+        )
+
+        res = []
+        start = 0
+        for project, plan in zip(projects, plans):
+            end = start + len(plan.requests_for_path)
+            res.extend(project.file_bumper.collect_patches(plan, results[start:end]))
+            start = end
+    count(PATCHES, len(res))
+    return res
+
+
+def get_commit_message(messages: List[str], new_version: str) -> str:
+    """Use the commit message of the projects if they all agree,
+    otherwise list them in the body
+    """
+    if len(messages) == 1:
+        return messages[0]
+    body = "\n".join(f"* {x}" for x in messages)
+    return f"Bump {len(messages)} projects to {new_version}\n\n{body}"
+
+
+def get_hook_jobs(projects: List[Project]) -> Optional[int]:
+    """Use the smallest limit set by any of the projects"""
+    limits = [x.config.hook_jobs for x in projects if x.config.hook_jobs]
+    return min(limits) if limits else None
+
+
+def unique(items: Iterable[H]) -> List[H]:
+    """Remove duplicates, keeping the first occurrence"""
+    return list(dict.fromkeys(items))
+
+
+class BatchExecutor(Executor):
+    """Update the config files and patch the files of several projects,
+    before committing and pushing them all at once
+    """
+
+    def __init__(
+        self, new_version: str, projects: Sequence[Project], patches: List[Patch]
+    ):
+        self.new_version = new_version
+        self.work = []
+        # Patches for all the projects are applied at once, so that
+        # files shared between projects are only written once
+        mmap_threshold = min(x.config.mmap_threshold for x in projects)
+        self.add_update_actions(
+            [x.config_file for x in projects], patches, mmap_threshold=mmap_threshold
+        )
@@ -1,25 +1,24 @@
 import sys
 import textwrap
-import urllib.parse
 from contextlib import suppress
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Union, cast
+from typing import TYPE_CHECKING, Dict, List, Optional, Union, cast
 
-import cli_ui as ui
 import docopt
-from packaging.version import InvalidVersion
-from packaging.version import parse as parse_version
 
-from tbump.config import get_config_file
 from tbump.error import Error
-from tbump.executor import Executor
-from tbump.file_bumper import FileBumper
-from tbump.git import GitError
-from tbump.git_bumper import GitBumper, GitBumperOptions
-from tbump.hooks import HooksRunner
-from tbump.init import init
+
+# Note: the other modules, and the libraries they use, are imported
+# by the functions that need them, so that commands like
+# `tbump --version` or `tbump current-version`, which are often run
+# from scripts, only pay for what they use.
+if TYPE_CHECKING:
+    from tbump.config import Config
+    from tbump.executor import Executor
+    from tbump.git import GitError
+    from tbump.hook_cache import HookCache
 
 TBUMP_VERSION = "6.11.0"
 
@@ -29,6 +28,7 @@ Usage:
   tbump [options] <new_version>
   tbump [options] current-version
   tbump [options] init [--pyproject] <current_version>
+  tbump [options] batch <new_version> [<path>...]
   tbump --help
   tbump --version
 
@@ -44,15 +44,32 @@ Options:
    --no-tag            Do not create a tag
    --no-push           Do not push after creating the commit and/or tag
    --no-tag-push       Create a tag, but don't push it
+   --jobs=<n>          Scan up to <n> files concurrently. Overrides `performance.jobs`.
+   --no-hook-cache     Run all hooks, even the ones that already succeeded with the same inputs.
+   --timings           Display how long each step took, along with a few counters.
+   --timings-json=<path>  Write the timings and counters as JSON to <path>.
 """
 )
 
 
 class Canceled(Error):
     def print_error(self) -> None:
+        import cli_ui as ui
+
         ui.error("Canceled by user")
 
 
+class InvalidJobs(Error):
+    def __init__(self, value: str):
+        super().__init__()
+        self.value = value
+
+    def print_error(self) -> None:
+        import cli_ui as ui
+
+        ui.error("--jobs should be a positive integer, got:", self.value)
+
+
 @dataclass
 class BumpOptions:
     working_path: Path
@@ -61,16 +78,37 @@ class BumpOptions:
     dry_run: bool = False
     config_path: Optional[Path] = None
     tag_message: Optional[str] = None
+    jobs: Optional[int] = None
+    hook_cache: bool = True
+    timings: bool = False
+    timings_path: Optional[Path] = None
+
+
+@dataclass
+class BatchOptions:
+    working_path: Path
+    new_version: str
+    project_paths: List[Path]
+    interactive: bool = True
+    dry_run: bool = False
+    tag_message: Optional[str] = None
+    jobs: Optional[int] = None
+    hook_cache: bool = True
+    timings: bool = False
+    timings_path: Optional[Path] = None
 
 
 class Command(Enum):
     bump = "bump"
     init = "init"
     current_version = "current_version"
+    batch = "batch"
     version = "version"
 
 
 def print_diff(filename: str, lineno: int, old: str, new: str) -> None:
+    import cli_ui as ui
+
     # fmt: off
     ui.info(
         ui.red, "- ", ui.reset,
@@ -99,6 +137,7 @@ class GivenCliArguments:
     bump_new_version: Optional[str]
     init_current_version: Optional[str]
     init_pyproject: bool
+    batch_paths: List[Path]
     working_path: Optional[Path]
     config_path: Optional[Path]
     tag_message: Optional[str]
@@ -108,6 +147,10 @@ class GivenCliArguments:
     no_tag: bool
     no_push: bool
     no_tag_push: bool
+    jobs: Optional[int]
+    no_hook_cache: bool
+    timings: bool
+    timings_path: Optional[Path]
 
     @classmethod
     def from_opts(
@@ -125,12 +168,22 @@ class GivenCliArguments:
         def _get_bool(key: str) -> bool:
             return cast(bool, opt_dict[key])
 
+        def _get_jobs() -> Optional[int]:
+            value = _get_str("--jobs")
+            if value is None:
+                return None
+            if not value.isdigit() or int(value) < 1:
+                raise InvalidJobs(value)
+            return int(value)
+
         # docopt has a hard time parsing the commands because run_bump uses that same cli slot for
         # the new version. This corrects those issues.
         command = Command.bump
         new_version = opt_dict["<new_version>"]
         if new_version == "init" or opt_dict["init"]:
             command = Command.init
+        elif new_version == "batch" or opt_dict["batch"]:
+            command = Command.batch
         elif new_version == "current-version":
             command = Command.current_version
         elif opt_dict["--version"]:
@@ -141,6 +194,7 @@ class GivenCliArguments:
             bump_new_version=_get_str("<new_version>"),
             init_current_version=_get_str("<current_version>"),
             init_pyproject=_get_bool("--pyproject"),
+            batch_paths=[Path(x) for x in cast(List[str], opt_dict["<path>"])],
             working_path=_get_path("--cwd"),
             config_path=_get_path("--config"),
             non_interactive=_get_bool("--non-interactive"),
@@ -150,6 +204,10 @@ class GivenCliArguments:
             no_tag=_get_bool("--no-tag"),
             no_push=_get_bool("--no-push"),
             no_tag_push=_get_bool("--no-tag-push"),
+            jobs=_get_jobs(),
+            no_hook_cache=_get_bool("--no-hook-cache"),
+            timings=_get_bool("--timings"),
+            timings_path=_get_path("--timings-json"),
         )
 
 
@@ -167,27 +225,50 @@ def run(cmd: List[str]) -> None:
     if arguments.command == Command.init and arguments.init_current_version is None:
         sys.exit(USAGE)
 
+    # Same thing with `tbump batch`
+    if arguments.command == Command.batch and not opt_dict["batch"]:
+        sys.exit(USAGE)
+
     # if a path wasn't given, use current working directory
     working_path = arguments.working_path or Path.cwd()
 
     # Ditto for `tbump current-version`
     if arguments.command == Command.current_version:
-        config_file = get_config_file(
-            working_path,
-            specified_config_path=arguments.config_path,
-        )
-        config = config_file.get_config()
-        print(config.current_version)
+        print(get_current_version(working_path, arguments.config_path))
         return
 
     if arguments.command == Command.init:
         run_init(arguments, working_path)
         return
 
+    if arguments.command == Command.batch:
+        run_batch(arguments, working_path)
+        return
+
     run_bump(arguments, working_path, arguments.tag_message)
 
 
+def get_current_version(working_path: Path, config_path: Optional[Path]) -> str:
+    """Read the current version without parsing and validating the whole
+    config file, which is much faster. If this fails, fall back to the
+    full config, so that errors are reported as usual
+    """
+    from tbump.config_reader import get_config_path_and_type, read_current_version
+
+    config_type, path = get_config_path_and_type(working_path, config_path)
+    res = read_current_version(config_type, path)
+    if res is not None:
+        return res
+
+    from tbump.config import get_config_file
+
+    config_file = get_config_file(working_path, specified_config_path=config_path)
+    return config_file.get_config().current_version
+
+
 def run_init(arguments: GivenCliArguments, working_path: Path) -> None:
+    from tbump.init import init
+
     init(
         working_path,
         current_version=cast(str, arguments.init_current_version),
@@ -206,16 +287,39 @@ def run_bump(
         config_path=arguments.config_path,
         dry_run=arguments.dry_run,
         interactive=not arguments.non_interactive,
+        jobs=arguments.jobs,
+        hook_cache=not arguments.no_hook_cache,
+        timings=arguments.timings,
+        timings_path=arguments.timings_path,
     )
 
     bump(bump_options, _construct_operations(arguments))
 
 
+def run_batch(arguments: GivenCliArguments, working_path: Path) -> None:
+    batch_options = BatchOptions(
+        working_path=working_path,
+        new_version=cast(str, arguments.bump_new_version),
+        project_paths=arguments.batch_paths,
+        tag_message=arguments.tag_message,
+        dry_run=arguments.dry_run,
+        interactive=not arguments.non_interactive,
+        jobs=arguments.jobs,
+        hook_cache=not arguments.no_hook_cache,
+        timings=arguments.timings,
+        timings_path=arguments.timings_path,
+    )
+
+    bump_batch(batch_options, _construct_operations(arguments))
+
+
 class NotANewVersion(Error):
     def __init__(self) -> None:
         super().__init__()
 
     def print_error(self) -> None:
+        import cli_ui as ui
+
         ui.error("New version is the same as the previous one")
 
 
@@ -226,6 +330,8 @@ class OlderNewVersion(Error):
         super().__init__()
 
     def print_error(self) -> None:
+        import cli_ui as ui
+
         ui.error(
             ui.reset,
             "New version",
@@ -239,18 +345,37 @@ class OlderNewVersion(Error):
 
 
 def bump(options: BumpOptions, operations: List[str]) -> None:
+    from tbump.timings import report_timings
+
+    with report_timings(display=options.timings, path=options.timings_path):
+        _bump(options, operations)
+
+
+def _bump(options: BumpOptions, operations: List[str]) -> None:
+    import cli_ui as ui
+
+    from tbump.config import get_config_file
+    from tbump.executor import Executor
+    from tbump.file_bumper import FileBumper
+    from tbump.git import GitError
+    from tbump.git_bumper import GitBumper, GitBumperOptions
+    from tbump.hooks import HooksRunner
+    from tbump.timings import phase
+
     working_path = options.working_path
     new_version = options.new_version
     interactive = options.interactive
     dry_run = options.dry_run
     specified_config_path = options.config_path
 
-    config_file = get_config_file(
-        options.working_path, specified_config_path=specified_config_path
-    )
-    config = config_file.get_config()
+    with phase("load config"):
+        config_file = get_config_file(
+            options.working_path, specified_config_path=specified_config_path
+        )
+        config = config_file.get_config()
 
-    check_versions(current=config.current_version, new=new_version)
+    with phase("check version"):
+        check_versions(current=config.current_version, new=new_version)
 
     # fmt: off
     ui.info_1(
@@ -265,29 +390,192 @@ def bump(options: BumpOptions, operations: List[str]) -> None:
     )
     git_bumper = GitBumper(bumper_options, operations)
     git_bumper.set_config(config)
-    git_state_error = None
+    git_state_error: Optional[GitError] = None
     try:
-        git_bumper.check_dirty()
-        git_bumper.check_branch_state(new_version)
+        with phase("git checks"):
+            git_bumper.check_dirty()
+            git_bumper.check_branch_state(new_version)
     except GitError as e:
         if dry_run:
             git_state_error = e
         else:
             raise
 
-    file_bumper = FileBumper(working_path, config)
+    file_bumper = FileBumper(working_path, config, jobs=options.jobs)
     file_bumper.check_files_exist()
     config_file.set_new_version(new_version)
 
     executor = Executor(new_version, file_bumper, config_file)
 
-    hooks_runner = HooksRunner(working_path, config.current_version, operations)
+    hooks_runner = HooksRunner(
+        working_path,
+        config.current_version,
+        operations,
+        jobs=config.hook_jobs,
+        cache=get_hook_cache(working_path, config) if options.hook_cache else None,
+    )
     if "hooks" in operations:
         for hook in config.hooks:
             hooks_runner.add_hook(hook)
 
     executor.add_git_and_hook_actions(new_version, git_bumper, hooks_runner)
 
+    if not confirm_and_run(
+        executor,
+        interactive=interactive,
+        dry_run=dry_run,
+        git_state_error=git_state_error,
+    ):
+        return
+
+    if config.github_url and "push_tag" in operations:
+        tag_name = git_bumper.get_tag_name(new_version)
+        suggest_creating_github_release(config.github_url, tag_name)
+
+
+def bump_batch(options: BatchOptions, operations: List[str]) -> None:
+    from tbump.timings import report_timings
+
+    with report_timings(display=options.timings, path=options.timings_path):
+        _bump_batch(options, operations)
+
+
+def _bump_batch(options: BatchOptions, operations: List[str]) -> None:
+    import cli_ui as ui
+
+    from tbump.batch import (
+        BatchExecutor,
+        get_all_patches,
+        get_commit_message,
+        get_hook_jobs,
+        load_projects,
+        unique,
+    )
+    from tbump.git import GitError
+    from tbump.git_bumper import GitBumper, GitBumperOptions
+    from tbump.hooks import HooksRunner
+    from tbump.timings import phase
+
+    working_path = options.working_path
+    new_version = options.new_version
+
+    with phase("load config"):
+        projects = load_projects(working_path, options.project_paths, jobs=options.jobs)
+    with phase("check version"):
+        for project in projects:
+            check_versions(current=project.config.current_version, new=new_version)
+
+    # fmt: off
+    ui.info_1(
+        "Bumping", ui.bold, len(projects), ui.reset, "projects",
+        "to", ui.bold, new_version,
+    )
+    # fmt: on
+
+    bumper_options = GitBumperOptions(
+        working_path=working_path,
+        tag_message=options.tag_message,
+    )
+    git_bumper = GitBumper(bumper_options, operations)
+    for project in projects:
+        # Disabling atomic pushes or enabling signing in any project
+        # applies to the whole batch
+        git_bumper.set_config(project.config)
+    messages = unique(
+        x.config.git_message_template.format(new_version=new_version) for x in projects
+    )
+    tag_names = unique(
+        x.config.git_tag_template.format(new_version=new_version) for x in projects
+    )
+    git_state_error: Optional[GitError] = None
+    try:
+        with phase("git checks"):
+            git_bumper.check_dirty()
+            git_bumper.check_branch_state_for(tag_names)
+    except GitError as e:
+        if options.dry_run:
+            git_state_error = e
+        else:
+            raise
+
+    for project in projects:
+        project.file_bumper.check_files_exist()
+    jobs = options.jobs or max(x.config.jobs for x in projects)
+    patches = get_all_patches(projects, new_version, jobs=jobs)
+    for project in projects:
+        project.config_file.set_new_version(new_version)
+
+    executor = BatchExecutor(new_version, projects, patches)
+
+    before_hooks = []
+    after_hooks = []
+    if "hooks" in operations:
+        for project in projects:
+            hooks_runner = HooksRunner(
+                project.path,
+                project.config.current_version,
+                operations,
+                jobs=project.config.hook_jobs,
+                cache=(
+                    get_hook_cache(project.path, project.config)
+                    if options.hook_cache
+                    else None
+                ),
+            )
+            for hook in project.config.hooks:
+                hooks_runner.add_hook(hook)
+            before_hooks.extend(hooks_runner.get_before_hooks(new_version))
+            after_hooks.extend(hooks_runner.get_after_hooks(new_version))
+
+    commit_message = get_commit_message(messages, new_version)
+    executor.add_git_and_hook_groups(
+        git_bumper.get_commands_for(commit_message, tag_names),
+        before_hooks,
+        after_hooks,
+        hook_jobs=get_hook_jobs(projects),
+    )
+
+    if not confirm_and_run(
+        executor,
+        interactive=options.interactive,
+        dry_run=options.dry_run,
+        git_state_error=git_state_error,
+    ):
+        return
+
+    if "push_tag" in operations:
+        for project in projects:
+            if project.config.github_url:
+                tag_name = project.config.git_tag_template.format(
+                    new_version=new_version
+                )
+                suggest_creating_github_release(project.config.github_url, tag_name)
+
+
+def get_hook_cache(project_path: Path, config: "Config") -> "HookCache":
+    from tbump.hook_cache import HookCache, get_default_cache_dir
+
+    # Relative cache directories are relative to the project
+    if config.hook_cache_dir:
+        path = project_path / config.hook_cache_dir
+    else:
+        path = get_default_cache_dir()
+    return HookCache(path, max_entries=config.hook_cache_size)
+
+
+def confirm_and_run(
+    executor: "Executor",
+    *,
+    interactive: bool,
+    dry_run: bool,
+    git_state_error: Optional["GitError"],
+) -> bool:
+    """Ask for confirmation and run the executor, unless in dry run mode.
+
+    Return True if the executor ran
+    """
+    import cli_ui as ui
+
     if interactive:
         executor.print_self(dry_run=True)
         if not dry_run:
@@ -301,16 +589,16 @@ def bump(options: BumpOptions, operations: List[str]) -> None:
             git_state_error.print_error()
             sys.exit(1)
         else:
-            return
+            return False
 
     executor.run()
-
-    if config.github_url and "push_tag" in operations:
-        tag_name = git_bumper.get_tag_name(new_version)
-        suggest_creating_github_release(config.github_url, tag_name)
+    return True
 
 
 def check_versions(*, current: str, new: str) -> None:
+    from packaging.version import InvalidVersion
+    from packaging.version import parse as parse_version
+
     if current == new:
         raise NotANewVersion()
 
@@ -322,6 +610,10 @@ def check_versions(*, current: str, new: str) -> None:
 
 
 def suggest_creating_github_release(github_url: str, tag_name: str) -> None:
+    import urllib.parse
+
+    import cli_ui as ui
+
     query_string = urllib.parse.urlencode({"tag": tag_name})
     if not github_url.endswith("/"):
         github_url += "/"
@@ -1,17 +1,45 @@
 import abc
 import re
-from dataclasses import dataclass
+from contextlib import suppress
+from dataclasses import asdict, dataclass, field, fields
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Pattern, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import cli_ui as ui
 import schema
-import tomlkit
-from tomlkit.toml_document import TOMLDocument
 
 from tbump.action import Action
+from tbump.config_cache import ConfigCache
+from tbump.config_reader import (  # noqa: F401 - ConfigNotFound is re-exported
+    ConfigNotFound,
+    get_config_path_and_type,
+    tomllib,
+)
 from tbump.error import Error
-from tbump.hooks import HOOKS_CLASSES, Hook
+from tbump.file_index import INDEX_KINDS, WALK_INDEX
+from tbump.hook_cache import DEFAULT_HOOK_CACHE_SIZE
+from tbump.hooks import (
+    HOOKS_CLASSES,
+    AfterPushHook,
+    BeforeCommitHook,
+    Hook,
+    find_cycle,
+    get_hook_dependencies,
+)
+from tbump.scanner import DEFAULT_MMAP_THRESHOLD
+
+if TYPE_CHECKING:
+    from tomlkit.toml_document import TOMLDocument
 
 
 @dataclass
@@ -43,39 +71,170 @@ class Config:
 
     github_url: Optional[str]
 
+    jobs: int = 1
+    ignored_dirs: List[str] = field(default_factory=list)
+    file_index: str = WALK_INDEX
+    mmap_threshold: int = DEFAULT_MMAP_THRESHOLD
+    # None means one per CPU
+    hook_jobs: Optional[int] = None
+    # None means in the user cache directory
+    hook_cache_dir: Optional[str] = None
+    hook_cache_size: int = DEFAULT_HOOK_CACHE_SIZE
+
+
+TABLE_HEADER_RE = re.compile(r"\s*\[([^\[\]]+)\]\s*(#.*)?$")
+
+
+def find_string_value(
+    text: str, table: Sequence[str], key: str
+) -> Optional[Tuple[int, int]]:
+    """Return the start and end of the string value of `key` in the
+    `[table]` section of the TOML `text`, quotes included.
+
+    Only the simple cases are handled: a `[a.b]` header, and a basic or
+    literal string on the same line as the key. Return None otherwise
+    """
+    value_re = re.compile(
+        r"\s*%s\s*=\s*(\"[^\"\\\n]*\"|'[^'\n]*')\s*(#.*)?$" % re.escape(key)
+    )
+    in_table = False
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith("["):
+            # Note: does not match [[array.of.tables]] headers
+            header = TABLE_HEADER_RE.match(line)
+            names = [x.strip() for x in header.group(1).split(".")] if header else []
+            in_table = names == list(table)
+        elif in_table:
+            match = value_re.match(line)
+            if match:
+                return pos + match.start(1), pos + match.end(1)
+        pos += len(line)
+    return None
+
+
+def get_line(text: str, pos: int) -> Tuple[int, str]:
+    """Return the number and the contents of the line containing `pos`"""
+    start = text.rfind("\n", 0, pos) + 1
+    end = text.find("\n", pos)
+    if end == -1:
+        end = len(text)
+    return text.count("\n", 0, pos) + 1, text[start:end]
+
 
 class ConfigFileUpdater(Action, metaclass=abc.ABCMeta):
     """Base class representing a config file"""
 
-    def __init__(self, project_path: Path, path: Path, doc: TOMLDocument):
+    # Keys leading to the current version
+    version_keys: Tuple[str, ...] = ()
+
+    def __init__(
+        self,
+        project_path: Path,
+        path: Path,
+        doc: Optional["TOMLDocument"] = None,
+        *,
+        old_text: Optional[str] = None,
+    ):
         self.project_path = project_path
         self.path = path
-        self.doc = doc
+        self._doc = doc
+        # Parsing, validating and rendering the document is costly,
+        # so each of them is done at most once
+        self._old_text = old_text
+        self._new_text: Optional[str] = None
+        self._config: Optional[Config] = None
+        self._new_version: Optional[str] = None
+        # Position of the current version in the old text, if it was
+        # replaced directly
+        self._version_span: Optional[Tuple[int, int]] = None
 
     @property
     def relative_path(self) -> Path:
         return self.project_path / self.path
 
+    @property
+    def doc(self) -> "TOMLDocument":
+        """The style-preserving document, only parsed when the file
+        needs to be changed
+        """
+        import tomlkit
+
+        if self._doc is None:
+            try:
+                self._doc = tomlkit.loads(self.old_text)
+            except tomlkit.exceptions.ParseError as e:
+                raise InvalidConfig(parse_error=e)
+        return self._doc
+
+    @property
+    def old_text(self) -> str:
+        """The contents of the file, as it was loaded"""
+        if self._old_text is None:
+            self._old_text = self.path.read_text()
+        return self._old_text
+
+    @property
+    def new_text(self) -> str:
+        """The contents of the file, with the new version"""
+        if self._new_text is None:
+            if self._doc is None:
+                # Nothing changed
+                return self.old_text
+            import tomlkit
+
+            self._new_text = tomlkit.dumps(self.doc)
+        return self._new_text
+
     def print_self(self) -> None:
         from tbump.cli import print_diff
 
-        old_text = self.path.read_text()
-        new_text = tomlkit.dumps(self.doc)
+        old_text = self.old_text
+        new_text = self.new_text
+
+        if self._version_span:
+            # Only one line changed, and we know where it is
+            start = self._version_span[0]
+            lineno, old_line = get_line(old_text, start)
+            _, new_line = get_line(new_text, start)
+            print_diff(
+                str(self.relative_path), lineno, old_line.strip(), new_line.strip()
+            )
+            return
 
         lineno = 1
         for old_line, new_line in zip(old_text.splitlines(), new_text.splitlines()):
             if old_line != new_line:
                 print_diff(
                     str(self.relative_path),
-                    lineno + 1,
+                    lineno,
                     old_line.strip(),
                     new_line.strip(),
                 )
             lineno += 1
 
     def do(self) -> None:
-        new_text = tomlkit.dumps(self.doc)
-        self.path.write_text(new_text)
+        if self._new_version is not None:
+            text = self.path.read_text()
+            if text != self.old_text:
+                # The file was patched since it was loaded, because it is
+                # also listed in the [[file]] sections: apply the new
+                # version to its current contents instead
+                self._old_text = text
+                self._doc = None
+                self.set_new_version(self._new_version)
+        self.path.write_text(self.new_text)
+
+    def get_data(self) -> dict:
+        """Return the contents of the file as plain data"""
+        if self._doc is not None or tomllib is None:
+            # Note: the document may contain a new version
+            return self.doc.unwrap()
+        # Much faster than building the document
+        try:
+            return tomllib.loads(self.new_text)
+        except tomllib.TOMLDecodeError as e:
+            raise InvalidConfig(parse_error=e)
 
     @abc.abstractmethod
     def get_parsed(self) -> dict:
@@ -83,29 +242,89 @@ class ConfigFileUpdater(Action, metaclass=abc.ABCMeta):
         by the `schema` library
         """
 
-    @abc.abstractmethod
     def set_new_version(self, version: str) -> None:
+        self._new_version = version
+        # Replacing the version in the text is much faster than building
+        # the document and rendering it
+        self._new_text = None
+        self._version_span = None
+        if self._doc is None:
+            self.replace_version(version)
+        if self._new_text is None:
+            self.update_doc(version)
+        # The config changed: validate it again if needed
+        self._config = None
+
+    def replace_version(self, version: str) -> None:
+        """Replace the current version directly in the text.
+
+        Leave the text unchanged if the version cannot be found this way,
+        or if anything else would change
+        """
+        if tomllib is None:
+            # Nothing to check the result with
+            return
+        *table, key = self.version_keys
+        span = find_string_value(self.old_text, table, key)
+        if not span:
+            return
+        start, end = span
+        quote = self.old_text[start]
+        new_text = self.old_text[:start] + quote + version + quote + self.old_text[end:]
+        try:
+            expected = tomllib.loads(self.old_text)
+            actual = tomllib.loads(new_text)
+        except tomllib.TOMLDecodeError:
+            return
+        parent = expected
+        for name in table:
+            parent = parent[name]
+        parent[key] = version
+        if actual != expected:
+            return
+        self._new_text = new_text
+        self._version_span = span
+
+    @abc.abstractmethod
+    def update_doc(self, version: str) -> None:
         pass
 
     def get_config(self) -> Config:
         """Return a validated Config instance"""
-        parsed = self.get_parsed()
-        res = from_parsed_config(parsed)
-        validate_config(res)
+        if self._config is None:
+            self._config = from_parsed_config(self.get_parsed())
+        return self._config
+
+    def get_cached_config(self, cache: ConfigCache) -> Config:
+        """Like get_config(), but look for the validated config in `cache`
+        first, and store it there otherwise
+        """
+        if self._config is not None:
+            return self._config
+        data = cache.get(self.path, self.old_text)
+        if data is not None:
+            try:
+                self._config = config_from_dict(data)
+                return self._config
+            except (KeyError, TypeError, ValueError, re.error):
+                # Written by a different version of tbump: replace it
+                pass
+        res = self.get_config()
+        # Failing to write to the cache must not prevent reading the config
+        with suppress(OSError):
+            cache.put(self.path, self.old_text, config_to_dict(res))
         return res
 
 
 class TbumpTomlUpdater(ConfigFileUpdater):
     """Represent config inside a tbump.toml file"""
 
-    def __init__(self, project_path: Path, path: Path, doc: TOMLDocument):
-        super().__init__(project_path, path, doc)
+    version_keys = ("version", "current")
 
     def get_parsed(self) -> dict:
-        # Document -> dict
-        return self.doc.value
+        return self.get_data()
 
-    def set_new_version(self, version: str) -> None:
+    def update_doc(self, version: str) -> None:
         self.doc["version"]["current"] = version  # type: ignore[index]
 
 
@@ -114,27 +333,17 @@ class PyprojectUpdater(ConfigFileUpdater):
     under the [tool.tbump] key
     """
 
-    def __init__(self, project_path: Path, path: Path, doc: TOMLDocument):
-        super().__init__(project_path, path, doc)
-
-    @staticmethod
-    def unwrap_data(data: Any) -> Any:
-        if hasattr(data, "unwrap") and callable(data.unwrap):
-            return data.unwrap()
-        else:
-            return data
+    version_keys = ("tool", "tbump", "version", "current")
 
     def get_parsed(self) -> dict:
         try:
-            tool_section = PyprojectUpdater.unwrap_data(
-                self.doc["tool"]["tbump"]  # type: ignore[index]
-            )
+            tool_section = self.get_data()["tool"]["tbump"]
         except KeyError as e:
             raise InvalidConfig(parse_error=e)
 
         return tool_section  # type: ignore[no-any-return]
 
-    def set_new_version(self, new_version: str) -> None:
+    def update_doc(self, new_version: str) -> None:
         self.doc["tool"]["tbump"]["version"]["current"] = new_version  # type: ignore[index]
 
 
@@ -170,10 +379,83 @@ def validate_hook_cmd(cmd: str) -> None:
         raise schema.SchemaError(message)
 
 
-def validate_basic_schema(config: dict) -> None:
-    """First pass of validation, using schema"""
-    # Note: asserts that we won't get KeyError or invalid types
-    # when building or initial Config instance
+def validate_hook_dependencies(hooks: List[Hook]) -> None:
+    for section, cls in [
+        ("before_commit", BeforeCommitHook),
+        ("after_push", AfterPushHook),
+    ]:
+        section_hooks = [x for x in hooks if isinstance(x, cls)]
+        names = {x.name for x in section_hooks}
+        for hook in section_hooks:
+            for name in hook.needs:
+                if name not in names:
+                    message = "%s hook '%s' needs unknown hook: '%s'" % (
+                        section,
+                        hook.name,
+                        name,
+                    )
+                    raise schema.SchemaError(message)
+        cycle = find_cycle(get_hook_dependencies(section_hooks))
+        if cycle:
+            names_in_cycle = " -> ".join(section_hooks[i].name for i in cycle)
+            message = "%s hooks depend on each other: %s" % (section, names_in_cycle)
+            raise schema.SchemaError(message)
+
+
+def validate_hook_inputs(hooks: List[Hook]) -> None:
+    for hook in hooks:
+        if hook.inputs and isinstance(hook, AfterPushHook):
+            message = "after_push hook '%s' cannot have inputs" % hook.name
+            raise schema.SchemaError(message)
+
+
+def validate_hook_timeout(hook: Hook) -> None:
+    if hook.timeout is not None and hook.timeout <= 0:
+        message = "hook '%s': timeout should be a positive number, got %s" % (
+            hook.name,
+            hook.timeout,
+        )
+        raise schema.SchemaError(message)
+
+
+def validate_jobs(jobs: int) -> None:
+    if jobs < 1:
+        message = "performance.jobs should be a positive integer, got %d" % jobs
+        raise schema.SchemaError(message)
+
+
+def validate_hook_jobs(hook_jobs: Optional[int]) -> None:
+    if hook_jobs is not None and hook_jobs < 1:
+        message = (
+            "performance.hook_jobs should be a positive integer, got %d" % hook_jobs
+        )
+        raise schema.SchemaError(message)
+
+
+def validate_hook_cache_size(hook_cache_size: int) -> None:
+    if hook_cache_size < 1:
+        message = (
+            "performance.hook_cache_size should be a positive integer, got %d"
+            % hook_cache_size
+        )
+        raise schema.SchemaError(message)
+
+
+def validate_mmap_threshold(mmap_threshold: int) -> None:
+    if mmap_threshold < 1:
+        message = (
+            "performance.mmap_threshold should be a positive integer, got %d"
+            % mmap_threshold
+        )
+        raise schema.SchemaError(message)
+
+
+def validate_regex(regex: str) -> str:
+    re.compile(regex, re.VERBOSE)
+    return regex
+
+
+def build_basic_schema() -> schema.Schema:
     file_schema = schema.Schema(
         {
             "src": str,
@@ -189,15 +471,21 @@ def validate_basic_schema(config: dict) -> None:
         }
     )
 
-    hook_schema = schema.Schema({"name": str, "cmd": str})
-
-    def validate_re(regex: str) -> str:
-        re.compile(regex, re.VERBOSE)
-        return regex
+    hook_schema = schema.Schema(
+        {
+            "name": str,
+            "cmd": str,
+            schema.Optional("parallel"): bool,
+            schema.Optional("group"): str,
+            schema.Optional("needs"): schema.And(schema.Use(list), [str]),
+            schema.Optional("inputs"): schema.And(schema.Use(list), [str]),
+            schema.Optional("timeout"): schema.Or(int, float),
+        }
+    )
 
-    tbump_schema = schema.Schema(
+    return schema.Schema(
         {
-            "version": {"current": str, "regex": schema.Use(validate_re)},
+            "version": {"current": str, "regex": schema.Use(validate_regex)},
             "git": {
                 "message_template": str,
                 "tag_template": str,
@@ -211,9 +499,36 @@ def validate_basic_schema(config: dict) -> None:
             schema.Optional("before_commit"): [hook_schema],
             schema.Optional("after_push"): [hook_schema],
             schema.Optional("github_url"): str,
+            schema.Optional("performance"): {
+                schema.Optional("jobs"): int,
+                # Note: tomlkit arrays must be converted before validation
+                schema.Optional("ignored_dirs"): schema.And(schema.Use(list), [str]),
+                schema.Optional("file_index"): schema.Or(*INDEX_KINDS),
+                schema.Optional("mmap_threshold"): int,
+                schema.Optional("hook_jobs"): int,
+                schema.Optional("hook_cache_dir"): str,
+                schema.Optional("hook_cache_size"): int,
+            },
         }
     )
-    tbump_schema.validate(config)
+
+
+# Built on first use, then shared by all validations
+_BASIC_SCHEMA: Optional[schema.Schema] = None
+
+
+def get_basic_schema() -> schema.Schema:
+    global _BASIC_SCHEMA
+    if _BASIC_SCHEMA is None:
+        _BASIC_SCHEMA = build_basic_schema()
+    return _BASIC_SCHEMA
+
+
+def validate_basic_schema(config: dict) -> None:
+    """First pass of validation, using schema"""
+    # Note: asserts that we won't get KeyError or invalid types
+    # when building or initial Config instance
+    get_basic_schema().validate(config)
 
 
 def validate_config(cfg: Config) -> None:
@@ -244,18 +559,37 @@ def validate_config(cfg: Config) -> None:
 
     for hook in cfg.hooks:
         validate_hook_cmd(hook.cmd)
+        validate_hook_timeout(hook)
+    validate_hook_dependencies(cfg.hooks)
+    validate_hook_inputs(cfg.hooks)
+
+    validate_jobs(cfg.jobs)
+    validate_mmap_threshold(cfg.mmap_threshold)
+    validate_hook_jobs(cfg.hook_jobs)
+    validate_hook_cache_size(cfg.hook_cache_size)
 
 
 def get_config_file(
-    project_path: Path, *, specified_config_path: Optional[Path] = None
+    project_path: Path,
+    *,
+    specified_config_path: Optional[Path] = None,
+    cache: Optional[ConfigCache] = None,
 ) -> ConfigFileUpdater:
+    """Load and validate the config file of the project.
+
+    If a `cache` is given, the validated config is read from it when the
+    file did not change, without parsing the file
+    """
     try:
-        config_type, config_path = _get_config_path_and_type(
+        config_type, config_path = get_config_path_and_type(
             project_path, specified_config_path
         )
         res = _get_config_file(project_path, config_type, config_path)
         # Make sure config is correct before returning it
-        res.get_config()
+        if cache:
+            res.get_cached_config(cache)
+        else:
+            res.get_config()
         return res
     except IOError as io_error:
         raise InvalidConfig(io_error=io_error)
@@ -263,32 +597,16 @@ def get_config_file(
         raise InvalidConfig(parse_error=parse_error)
 
 
-def _get_config_path_and_type(
-    project_path: Path, specified_config_path: Optional[Path] = None
-) -> Tuple[str, Path]:
-    if specified_config_path:
-        return "tbump.toml", specified_config_path
-
-    toml_path = project_path / "tbump.toml"
-    if toml_path.exists():
-        return "tbump.toml", toml_path
-
-    pyproject_path = project_path / "pyproject.toml"
-    if pyproject_path.exists():
-        return "pyproject.toml", pyproject_path
-
-    raise ConfigNotFound(project_path)
-
-
 def _get_config_file(
     project_path: Path, config_type: str, config_path: Path
 ) -> ConfigFileUpdater:
+    # Note: the document is only parsed when needed
     if config_type == "tbump.toml":
-        doc = tomlkit.loads(config_path.read_text())
-        return TbumpTomlUpdater(project_path, config_path, doc)
+        text = config_path.read_text()
+        return TbumpTomlUpdater(project_path, config_path, old_text=text)
     elif config_type == "pyproject.toml":
-        doc = tomlkit.loads(config_path.read_text())
-        return PyprojectUpdater(project_path, config_path, doc)
+        text = config_path.read_text()
+        return PyprojectUpdater(project_path, config_path, old_text=text)
     raise ValueError("unknown config_type: {config_type}")
 
 
@@ -320,11 +638,28 @@ def from_parsed_config(parsed: dict) -> Config:
         cls = HOOKS_CLASSES[hook_type]
         if hook_type in parsed:
             for hook_dict in parsed[hook_type]:
-                hook = cls(hook_dict["name"], hook_dict["cmd"])
+                hook = cls(
+                    hook_dict["name"],
+                    hook_dict["cmd"],
+                    parallel=hook_dict.get("parallel", False),
+                    group=hook_dict.get("group"),
+                    needs=list(hook_dict.get("needs", [])),
+                    inputs=list(hook_dict.get("inputs", [])),
+                    timeout=hook_dict.get("timeout"),
+                )
                 hooks.append(hook)
 
     github_url = parsed.get("github_url")
 
+    performance = parsed.get("performance", {})
+    jobs = performance.get("jobs", 1)
+    ignored_dirs = list(performance.get("ignored_dirs", []))
+    file_index = performance.get("file_index", WALK_INDEX)
+    mmap_threshold = performance.get("mmap_threshold", DEFAULT_MMAP_THRESHOLD)
+    hook_jobs = performance.get("hook_jobs")
+    hook_cache_dir = performance.get("hook_cache_dir")
+    hook_cache_size = performance.get("hook_cache_size", DEFAULT_HOOK_CACHE_SIZE)
+
     config = Config(
         current_version=current_version,
         version_regex=version_regex,
@@ -336,6 +671,13 @@ def from_parsed_config(parsed: dict) -> Config:
         files=files,
         hooks=hooks,
         github_url=github_url,
+        jobs=jobs,
+        ignored_dirs=ignored_dirs,
+        file_index=file_index,
+        mmap_threshold=mmap_threshold,
+        hook_jobs=hook_jobs,
+        hook_cache_dir=hook_cache_dir,
+        hook_cache_size=hook_cache_size,
     )
 
     validate_config(config)
@@ -343,14 +685,44 @@ def from_parsed_config(parsed: dict) -> Config:
     return config
 
 
-class ConfigNotFound(Error):
-    def __init__(self, project_path: Path):
-        self.project_path = project_path
-
-    def print_error(self) -> None:
-        ui.error("No configuration for tbump found in", self.project_path)
-        ui.info("Please run `tbump init` to create a tbump.toml file")
-        ui.info("Or add a [tool.tbump] section in the pyproject.toml file")
+def hook_to_dict(hook: Hook) -> Dict[str, Any]:
+    hook_type = "after_push" if isinstance(hook, AfterPushHook) else "before_commit"
+    return {
+        "type": hook_type,
+        "name": hook.name,
+        "cmd": hook.cmd,
+        "parallel": hook.parallel,
+        "group": hook.group,
+        "needs": hook.needs,
+        "inputs": hook.inputs,
+        "timeout": hook.timeout,
+    }
+
+
+def hook_from_dict(data: Dict[str, Any]) -> Hook:
+    kwargs = dict(data)
+    cls = HOOKS_CLASSES[kwargs.pop("type")]
+    return cls(kwargs.pop("name"), kwargs.pop("cmd"), **kwargs)
+
+
+def config_to_dict(config: Config) -> Dict[str, Any]:
+    """Serialize a validated Config to plain data, suitable for JSON"""
+    res = {x.name: getattr(config, x.name) for x in fields(config)}
+    res["version_regex"] = config.version_regex.pattern
+    res["files"] = [asdict(x) for x in config.files]
+    res["fields"] = [asdict(x) for x in config.fields]
+    res["hooks"] = [hook_to_dict(x) for x in config.hooks]
+    return res
+
+
+def config_from_dict(data: Dict[str, Any]) -> Config:
+    """Opposite of config_to_dict(). Note: the result is not validated again"""
+    kwargs = dict(data)
+    kwargs["version_regex"] = re.compile(data["version_regex"], re.VERBOSE)
+    kwargs["files"] = [File(**x) for x in data["files"]]
+    kwargs["fields"] = [Field(**x) for x in data["fields"]]
+    kwargs["hooks"] = [hook_from_dict(x) for x in data["hooks"]]
+    return Config(**kwargs)
 
 
 class InvalidConfig(Error):
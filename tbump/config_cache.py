@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from tbump.hook_cache import get_user_cache_dir
+
+# Bump this when the way configs are serialized changes
+CACHE_VERSION = 1
+
+
+def get_default_cache_dir() -> Path:
+    return get_user_cache_dir() / "configs"
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ConfigCache:
+    """Remember validated configs, so that reading an unchanged config file
+    does not require parsing and validating it again.
+
+    There is one entry per config file, named after a hash of its path.
+    It contains the serialized config, along with the size, modification
+    time and hash of the contents of the file it was read from. The entry
+    is only used if all three still match.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def get_entry_path(self, config_path: Path) -> Path:
+        key = hashlib.sha256(str(config_path.resolve()).encode()).hexdigest()
+        return self.path / (key + ".json")
+
+    def get(self, config_path: Path, text: str) -> Optional[Dict[str, Any]]:
+        """Return the data stored for `config_path`, or None if there is
+        none or if the file changed since.
+
+        `text` is the current contents of the file
+        """
+        try:
+            stat = config_path.stat()
+            entry = json.loads(self.get_entry_path(config_path).read_text())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+            return None
+        # Compare the cheap properties first
+        if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime_ns:
+            return None
+        if entry.get("hash") != hash_text(text):
+            return None
+        data = entry.get("data")
+        return data if isinstance(data, dict) else None
+
+    def put(self, config_path: Path, text: str, data: Dict[str, Any]) -> None:
+        """Store `data` for `config_path`, whose contents are `text`"""
+        stat = config_path.stat()
+        entry = {
+            "version": CACHE_VERSION,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": hash_text(text),
+            "data": data,
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Several processes may read the same config at once, so write the
+        # entry next to its final location, then move it there
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(entry, separators=(",", ":")))
+            os.replace(tmp_path, self.get_entry_path(config_path))
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
@@ -0,0 +1,79 @@
+"""Locate the config file, and read values from it without validating it.
+
+This module only relies on the standard library, so that reading a single
+value (like the current version) does not pay for tomlkit's style-preserving
+parser nor for the validation of the whole config
+"""
+
+import sys
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from tbump.error import Error
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    # Use tomli if it happens to be installed
+    try:
+        import tomli as tomllib  # type: ignore[import-not-found]
+    except ImportError:
+        tomllib = None
+
+
+class ConfigNotFound(Error):
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+
+    def print_error(self) -> None:
+        import cli_ui as ui
+
+        ui.error("No configuration for tbump found in", self.project_path)
+        ui.info("Please run `tbump init` to create a tbump.toml file")
+        ui.info("Or add a [tool.tbump] section in the pyproject.toml file")
+
+
+def get_config_path_and_type(
+    project_path: Path, specified_config_path: Optional[Path] = None
+) -> Tuple[str, Path]:
+    if specified_config_path:
+        return "tbump.toml", specified_config_path
+
+    toml_path = project_path / "tbump.toml"
+    if toml_path.exists():
+        return "tbump.toml", toml_path
+
+    pyproject_path = project_path / "pyproject.toml"
+    if pyproject_path.exists():
+        return "pyproject.toml", pyproject_path
+
+    raise ConfigNotFound(project_path)
+
+
+def get_key(data: Any, *keys: str) -> Any:
+    """Return data[key1][key2]..., or None if any of them is missing"""
+    for key in keys:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def read_current_version(config_type: str, config_path: Path) -> Optional[str]:
+    """Return the current version from the config file, using a fast parser.
+
+    Return None if it cannot be read this way (no fast parser available,
+    invalid file, missing key ...), in which case the caller should use
+    the full config, which reports errors properly
+    """
+    if tomllib is None:
+        return None
+    try:
+        with config_path.open("rb") as f:
+            parsed = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError):
+        return None
+    if config_type == "pyproject.toml":
+        parsed = get_key(parsed, "tool", "tbump")
+    res = get_key(parsed, "version", "current")
+    return res if isinstance(res, str) else None
@@ -1,12 +1,12 @@
-from typing import List, Sequence
+from typing import List, Optional, Sequence
 
 import cli_ui as ui
 
 from tbump.action import Action
 from tbump.config import ConfigFileUpdater
-from tbump.file_bumper import FileBumper
-from tbump.git_bumper import GitBumper
-from tbump.hooks import HooksRunner
+from tbump.file_bumper import FileBumper, Patch, apply_patches
+from tbump.git_bumper import Command, GitBumper
+from tbump.hooks import Hook, HooksRunner, run_hooks
 
 
 class ActionGroup:
@@ -40,6 +40,48 @@ class ActionGroup:
             action.do()
 
 
+class PatchGroup(ActionGroup):
+    """Apply all the patches at once, so that each file is
+    read and written only once, no matter how many of its lines change
+    """
+
+    def __init__(
+        self,
+        dry_run_desc: str,
+        desc: str,
+        patches: List[Patch],
+        *,
+        mmap_threshold: int,
+    ):
+        super().__init__(dry_run_desc, desc, patches)
+        self.patches = patches
+        self.mmap_threshold = mmap_threshold
+
+    def execute(self) -> None:
+        apply_patches(self.patches, mmap_threshold=self.mmap_threshold)
+
+
+class HooksGroup(ActionGroup):
+    """Run the hooks, letting the ones marked as `parallel` or sharing
+    a `group` run concurrently
+    """
+
+    def __init__(
+        self,
+        dry_run_desc: str,
+        desc: str,
+        hooks: Sequence[Hook],
+        *,
+        jobs: Optional[int] = None,
+    ):
+        super().__init__(dry_run_desc, desc, hooks, should_enumerate=True)
+        self.hooks = list(hooks)
+        self.jobs = jobs
+
+    def execute(self) -> None:
+        run_hooks(self.hooks, jobs=self.jobs)
+
+
 class Executor:
     def __init__(
         self,
@@ -49,47 +91,78 @@ class Executor:
     ):
         self.new_version = new_version
         self.work: List[ActionGroup] = []
-
-        update_config_group = ActionGroup(
-            f"Would update current version in {config_file.relative_path}",
-            "Updating current version",
+        self.add_update_actions(
             [config_file],
-            should_enumerate=False,
+            file_bumper.get_patches(new_version),
+            mmap_threshold=file_bumper.mmap_threshold,
         )
-        self.work.append(update_config_group)
 
-        patches = ActionGroup(
+    def add_update_actions(
+        self,
+        config_files: Sequence[ConfigFileUpdater],
+        patches: List[Patch],
+        *,
+        mmap_threshold: int,
+    ) -> None:
+        # Patches hold offsets in the files as they were scanned, so they
+        # are applied first, in case a config file is also patched
+        patch_group = PatchGroup(
             "Would patch these files",
             "Patching files",
-            file_bumper.get_patches(new_version),
+            patches,
+            mmap_threshold=mmap_threshold,
+        )
+        self.work.append(patch_group)
+
+        paths = ", ".join(str(x.relative_path) for x in config_files)
+        update_config_group = ActionGroup(
+            f"Would update current version in {paths}",
+            "Updating current version",
+            config_files,
+            should_enumerate=False,
         )
-        self.work.append(patches)
+        self.work.append(update_config_group)
 
     def add_git_and_hook_actions(
         self, new_version: str, git_bumper: GitBumper, hooks_runner: HooksRunner
     ) -> None:
-        before_hooks = ActionGroup(
+        self.add_git_and_hook_groups(
+            git_bumper.get_commands(new_version),
+            hooks_runner.get_before_hooks(new_version),
+            hooks_runner.get_after_hooks(new_version),
+            hook_jobs=hooks_runner.jobs,
+        )
+
+    def add_git_and_hook_groups(
+        self,
+        git_commands: Sequence[Command],
+        before_hooks: Sequence[Hook],
+        after_hooks: Sequence[Hook],
+        *,
+        hook_jobs: Optional[int] = None,
+    ) -> None:
+        before_hooks_group = HooksGroup(
             "Would run these hooks before commit",
             "Running hooks before commit",
-            hooks_runner.get_before_hooks(new_version),
-            should_enumerate=True,
+            before_hooks,
+            jobs=hook_jobs,
         )
-        self.work.append(before_hooks)
+        self.work.append(before_hooks_group)
 
-        git_commands = ActionGroup(
+        git_commands_group = ActionGroup(
             "Would run these git commands",
             "Performing git operations",
-            git_bumper.get_commands(new_version),
+            git_commands,
         )
-        self.work.append(git_commands)
+        self.work.append(git_commands_group)
 
-        after_hooks = ActionGroup(
+        after_hooks_group = HooksGroup(
             "Would run these hooks after push",
             "Running hooks after push",
-            hooks_runner.get_after_hooks(new_version),
-            should_enumerate=True,
+            after_hooks,
+            jobs=hook_jobs,
         )
-        self.work.append(after_hooks)
+        self.work.append(after_hooks_group)
 
     def print_self(self, *, dry_run: bool = False) -> None:
         for action_group in self.work:
@@ -1,14 +1,48 @@
-import glob
+import dataclasses
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Pattern
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import cli_ui as ui
 
 from tbump.action import Action
 from tbump.config import Config, File, get_config_file
 from tbump.error import Error
+from tbump.file_index import FileIndex
+from tbump.scanner import (
+    DEFAULT_MMAP_THRESHOLD,
+    Buffer,
+    LineCounter,
+    Replacement,
+    find_all,
+    get_line_span,
+    iter_matching_lines,
+    map_file,
+    merge_replacements,
+    rewrite_file,
+    splice,
+)
+from tbump.timings import (
+    BYTES_READ,
+    FILES_SCANNED,
+    LINES_EXAMINED,
+    PATCHES,
+    count,
+    phase,
+)
 
 
 @dataclass
@@ -17,18 +51,60 @@ class ChangeRequest:
     old_string: str
     new_string: str
     search: Optional[str] = None
+    search_regex: Optional[Pattern[str]] = dataclasses.field(
+        default=None, compare=False
+    )
+    buffer_search_regex: Optional[Pattern[str]] = dataclasses.field(
+        default=None, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        # Compile the search pattern once, instead of relying on the
+        # small cache of the `re` module for each line
+        if self.search and not self.search_regex:
+            self.search_regex = re.compile(self.search)
+        if self.search and not self.buffer_search_regex:
+            self.buffer_search_regex = compile_buffer_search(self.search)
 
 
 class Patch(Action):
+    """Replace the old line of a file by the new one.
+
+    Patches found when scanning a file know the byte offsets of each
+    string to replace in the line, so they can be applied without
+    splitting the file into lines. In this case the line number is
+    only computed when needed, using the `line_counter` shared by all
+    the patches of the file.
+    """
+
     def __init__(
-        self, working_path: Path, src: str, lineno: int, old_line: str, new_line: str
+        self,
+        working_path: Path,
+        src: str,
+        lineno: Optional[int],
+        old_line: str,
+        new_line: str,
+        *,
+        replacements: Optional[List[Replacement]] = None,
+        line_start: int = 0,
+        line_counter: Optional[LineCounter] = None,
     ):
         super().__init__()
         self.working_path = working_path
         self.src = src
-        self.lineno = lineno
+        self._lineno = lineno
         self.old_line = old_line
         self.new_line = new_line
+        self.replacements = replacements
+        self.line_start = line_start
+        self.line_counter = line_counter
+
+    @property
+    def lineno(self) -> int:
+        if self._lineno is None:
+            assert self.line_counter
+            self._lineno = self.line_counter.lineno(self.line_start)
+        return self._lineno
 
     def print_self(self) -> None:
         from tbump.cli import print_diff
@@ -40,21 +116,64 @@ class Patch(Action):
     def do(self) -> None:
         self.apply()
 
-    @staticmethod
-    def get_ending(line: bytes) -> bytes:
-        if line.endswith(b"\r\n"):
-            return b"\r\n"
-        else:
-            return b"\n"
+    @property
+    def file_path(self) -> Path:
+        return self.working_path / self.src
 
     def apply(self) -> None:
-        file_path = self.working_path / self.src
-        contents = file_path.read_bytes()
-        lines = contents.splitlines(keepends=True)
-        old_line = lines[self.lineno]
-        lines[self.lineno] = self.new_line.encode() + Patch.get_ending(old_line)
-        text = b"".join(lines)
-        file_path.write_bytes(text)
+        apply_patches([self])
+
+    def get_replacements(self, buf: Buffer) -> List[Replacement]:
+        if self.replacements is not None:
+            # The offsets are only valid if the file did not change
+            # since it was scanned
+            old_bytes = self.old_line.encode()
+            start = self.line_start
+            end = start + len(old_bytes)
+            if buf[start:end] != old_bytes:
+                raise FileChanged(src=self.src, lineno=self.lineno + 1)
+            return self.replacements
+        # Patch built from a line number only: replace the whole line
+        start, end = get_line_span(buf, self.lineno)
+        return [(start, end, self.new_line.encode())]
+
+
+def apply_patches(
+    patches: Sequence[Patch], *, mmap_threshold: int = DEFAULT_MMAP_THRESHOLD
+) -> None:
+    """Apply all the patches, reading and writing each file only once.
+
+    Patches are applied in order. If several of them replace the same
+    bytes, the longest replacement wins, or the last one if they have
+    the same length - see `merge_replacements()`.
+
+    Files bigger than `mmap_threshold` are never loaded in memory.
+    """
+    # Note: the same file may be reached through different paths, for
+    # instance when it is shared between projects
+    patches_by_path: Dict[Path, List[Patch]] = {}
+    for patch in patches:
+        patches_by_path.setdefault(patch.file_path.resolve(), []).append(patch)
+
+    with phase("apply patches"):
+        for file_path, file_patches in patches_by_path.items():
+            if file_path.stat().st_size >= mmap_threshold:
+                with map_file(file_path) as buf:
+                    replacements = get_replacements(buf, file_patches)
+                rewrite_file(file_path, replacements)
+            else:
+                contents = file_path.read_bytes()
+                replacements = get_replacements(contents, file_patches)
+                file_path.write_bytes(splice(contents, replacements))
+
+
+def get_replacements(buf: Buffer, patches: List[Patch]) -> List[Replacement]:
+    replacements = []
+    for patch in patches:
+        replacements.extend(patch.get_replacements(buf))
+    # Several projects may change the same bytes the same way
+    unique_replacements = list(dict.fromkeys(replacements))
+    return merge_replacements(unique_replacements)
 
 
 class BadSubstitution(Error):
@@ -65,7 +184,7 @@ class BadSubstitution(Error):
         verb: str,
         groups: Dict[str, str],
         template: str,
-        version: str
+        version: str,
     ):
         super().__init__()
         self.src = src
@@ -115,6 +234,19 @@ class SourceFileNotFound(Error):
         ui.error("the file", self.src, "does not exist")
 
 
+class FileChanged(Error):
+    def __init__(self, *, src: str, lineno: int):
+        super().__init__()
+        self.src = src
+        self.lineno = lineno
+
+    def print_error(self) -> None:
+        ui.error(
+            "%s:%d" % (self.src, self.lineno),
+            "changed since it was scanned, not patching it",
+        )
+
+
 class CurrentVersionNotFound(Error):
     def __init__(self, *, src: str, current_version_string: str):
         super().__init__()
@@ -130,11 +262,67 @@ class CurrentVersionNotFound(Error):
         )
 
 
-def should_replace(line: str, old_string: str, search: Optional[str] = None) -> bool:
+def should_replace(
+    line: str, old_string: str, search: Union[str, Pattern[str], None] = None
+) -> bool:
     if not search:
         return old_string in line
-    else:
-        return (old_string in line) and (re.search(search, line) is not None)
+    # Note: the cheap check comes first, so that the regex only runs
+    # on lines containing the old string
+    if old_string not in line:
+        return False
+    if isinstance(search, str):
+        return re.search(search, line) is not None
+    return search.search(line) is not None
+
+
+def compile_buffer_search(search: str) -> Optional[Pattern[str]]:
+    """Compile the search pattern so that it can run over a whole file
+    instead of line by line.
+
+    Return None if this may give different results than searching
+    each line, for instance when the pattern uses lookarounds, which
+    would see the neighbouring lines.
+    """
+    for token in (r"\A", r"\Z", "(?=", "(?!", "(?<"):
+        if token in search:
+            return None
+    regex = re.compile(search, re.MULTILINE)
+    if regex.search(""):
+        return None
+    return regex
+
+
+def find_searched_lines(
+    buf: Buffer, regex: Optional[Pattern[str]]
+) -> Optional[Set[int]]:
+    """Run the search regex once over the buffer, and return the offsets
+    of the lines where it matches.
+
+    Return None when the results could differ from searching each line
+    separately: the lines must then be checked one by one.
+    """
+    if regex is None or not isinstance(buf, bytes):
+        return None
+    # With pure ASCII contents, offsets in the decoded text are the same
+    # as in the buffer, and without carriage returns lines are delimited
+    # the same way as when searching them one by one
+    if not buf.isascii() or b"\r" in buf:
+        return None
+    text = buf.decode("ascii")
+    res = set()
+    for match in regex.finditer(text):
+        if text.find("\n", match.start(), match.end()) != -1:
+            # The match spans several lines
+            return None
+        res.add(text.rfind("\n", 0, match.start()) + 1)
+    return res
+
+
+def compile_matcher(strings: List[bytes]) -> Pattern[bytes]:
+    """Return a regex matching any of the given strings"""
+    unique_strings = sorted(set(strings))
+    return re.compile(b"|".join(re.escape(x) for x in unique_strings))
 
 
 def on_version_containing_none(
@@ -145,14 +333,64 @@ def on_version_containing_none(
     )
 
 
+ScanJob = Tuple[Path, List[ChangeRequest]]
+
+J = TypeVar("J")
+T = TypeVar("T")
+
+
+@dataclass
+class ScanPlan:
+    """Which files to scan for which change requests"""
+
+    change_requests: List[ChangeRequest]
+    # Paths matching the `src` of each change request
+    paths_for_requests: List[List[Path]] = dataclasses.field(default_factory=list)
+    # Indexes of the change requests to look for in each path
+    requests_for_path: Dict[Path, List[int]] = dataclasses.field(default_factory=dict)
+
+    @property
+    def scan_jobs(self) -> List[ScanJob]:
+        return [
+            (path, [self.change_requests[i] for i in indexes])
+            for path, indexes in self.requests_for_path.items()
+        ]
+
+
+def run_scan_jobs(
+    scan_jobs: Sequence[J], scan: Callable[[J], T], *, jobs: int
+) -> List[T]:
+    """Call scan() for each job, using a pool of threads if jobs > 1
+
+    Results are returned in the same order as the jobs, so
+    the patches do not depend on which thread finished first.
+    """
+    if jobs == 1 or len(scan_jobs) < 2:
+        return [scan(job) for job in scan_jobs]
+    max_workers = min(jobs, len(scan_jobs))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(scan, scan_jobs))
+
+
 class FileBumper:
-    def __init__(self, working_path: Path, config: Config):
+    def __init__(
+        self, working_path: Path, config: Config, *, jobs: Optional[int] = None
+    ):
         self.working_path = working_path
+        self.jobs = jobs or config.jobs
+        self.mmap_threshold = config.mmap_threshold
         self.files = config.files
         self.fields = config.fields
         self.version_regex = config.version_regex
         self.current_version = config.current_version
 
+        self.file_index = FileIndex(
+            working_path,
+            [file.src for file in self.files],
+            ignored_dirs=config.ignored_dirs,
+            index=config.file_index,
+        )
+
         self.current_groups = self.parse_version(self.current_version)
         self.new_version = ""
         self.new_groups: Dict[str, str] = {}
@@ -172,50 +410,159 @@ class FileBumper:
 
     def check_files_exist(self) -> None:
         assert self.files
-        for file in self.files:
-            expected_path = self.working_path / file.src
-            files_found = glob.glob(str(expected_path), recursive=True)
-            if not files_found:
-                raise SourceFileNotFound(src=file.src)
+        with phase("expand globs"):
+            for file in self.files:
+                files_found = self.file_index.expand(file.src)
+                if not files_found:
+                    raise SourceFileNotFound(src=file.src)
 
     def get_patches(self, new_version: str) -> List[Patch]:
-        self.new_version = new_version
-        self.new_groups = self.parse_version(self.new_version)
-        change_requests = self.compute_change_requests()
-        patches = []
-        for change_request in change_requests:
-            patches_for_request = self.compute_patches_for_change_request(
-                change_request
-            )
-            patches.extend(patches_for_request)
-        return patches
+        with phase("scan files"):
+            plan = self.plan_patches(new_version)
+            results = run_scan_jobs(plan.scan_jobs, self.scan_job, jobs=self.jobs)
+            res = self.collect_patches(plan, results)
+        count(PATCHES, len(res))
+        return res
 
     def compute_patches_for_change_request(
         self, change_request: ChangeRequest
     ) -> List[Patch]:
-        old_string = change_request.old_string
-        new_string = change_request.new_string
-        search = change_request.search
-        patches = []
-
-        file_path_glob = self.working_path / change_request.src
-        for file_path_str in glob.glob(str(file_path_glob), recursive=True):
-            file_path = Path(file_path_str)
-            expanded_src = file_path.relative_to(self.working_path)
-            old_lines = file_path.read_text().splitlines(keepends=False)
-
-            for i, old_line in enumerate(old_lines):
-                if should_replace(old_line, old_string, search):
-                    new_line = old_line.replace(old_string, new_string)
-                    patch = Patch(
-                        self.working_path, str(expanded_src), i, old_line, new_line
-                    )
-                    patches.append(patch)
-        if not patches:
-            raise CurrentVersionNotFound(
-                src=change_request.src, current_version_string=old_string
-            )
-        return patches
+        return self.compute_patches([change_request])
+
+    def compute_patches(self, change_requests: List[ChangeRequest]) -> List[Patch]:
+        plan = self.plan_scan(change_requests)
+        results = run_scan_jobs(plan.scan_jobs, self.scan_job, jobs=self.jobs)
+        return self.collect_patches(plan, results)
+
+    def plan_patches(self, new_version: str) -> ScanPlan:
+        """Like get_patches(), but only decide which files to scan"""
+        self.new_version = new_version
+        self.new_groups = self.parse_version(self.new_version)
+        return self.plan_scan(self.compute_change_requests())
+
+    def plan_scan(self, change_requests: List[ChangeRequest]) -> ScanPlan:
+        # Several change requests may target the same file (for instance
+        # with different `search` or `version_template` values), so
+        # group them by file first: this way each file is read and
+        # scanned only once, no matter how many requests apply to it.
+        plan = ScanPlan(change_requests)
+        for i, change_request in enumerate(change_requests):
+            paths = self.expand_src(change_request.src)
+            plan.paths_for_requests.append(paths)
+            for path in paths:
+                plan.requests_for_path.setdefault(path, []).append(i)
+        return plan
+
+    def collect_patches(
+        self, plan: ScanPlan, results: List[List[List[Patch]]]
+    ) -> List[Patch]:
+        """Turn the results of the plan's scan jobs into patches"""
+        found: Dict[Tuple[int, Path], List[Patch]] = {}
+        for (path, indexes), patches_per_request in zip(
+            plan.requests_for_path.items(), results
+        ):
+            for i, patches in zip(indexes, patches_per_request):
+                found[(i, path)] = patches
+
+        # Keep the patches in the same order as if each change request
+        # had been processed separately
+        res = []
+        for i, change_request in enumerate(plan.change_requests):
+            patches = []
+            for path in plan.paths_for_requests[i]:
+                patches.extend(found[(i, path)])
+            if not patches:
+                raise CurrentVersionNotFound(
+                    src=change_request.src,
+                    current_version_string=change_request.old_string,
+                )
+            res.extend(patches)
+        return res
+
+    def expand_src(self, src: str) -> List[Path]:
+        return self.file_index.expand(src)
+
+    def scan_job(self, job: ScanJob) -> List[List[Patch]]:
+        return self.scan_file(*job)
+
+    def scan_file(
+        self, file_path: Path, change_requests: List[ChangeRequest]
+    ) -> List[List[Patch]]:
+        """Look for all the change requests in one pass over the file.
+
+        Return the list of patches found for each change request
+        """
+        size = file_path.stat().st_size
+        count(FILES_SCANNED)
+        count(BYTES_READ, size)
+        if size < self.mmap_threshold:
+            contents = file_path.read_bytes()
+            return self.scan_buffer(file_path, contents, change_requests)
+
+        # Very large file: search the memory-mapped file directly,
+        # so that only the lines containing a hit are ever copied
+        with map_file(file_path) as buf:
+            res = self.scan_buffer(file_path, buf, change_requests)
+            # The buffer will be closed, so compute the line numbers now
+            for patches in res:
+                for patch in patches:
+                    patch.lineno
+            return res
+
+    def scan_buffer(
+        self, file_path: Path, buf: Buffer, change_requests: List[ChangeRequest]
+    ) -> List[List[Patch]]:
+        expanded_src = str(file_path.relative_to(self.working_path))
+        old_strings = [x.old_string.encode() for x in change_requests]
+        new_strings = [x.new_string.encode() for x in change_requests]
+        matcher = compile_matcher(old_strings)
+        line_counter = LineCounter(buf)
+        res: List[List[Patch]] = [[] for _ in change_requests]
+
+        # For change requests with a `search` pattern, try and run the
+        # regex once over the whole buffer instead of once per line
+        searched_lines = [
+            find_searched_lines(buf, x.buffer_search_regex) for x in change_requests
+        ]
+
+        # Only the lines containing at least one of the old strings are
+        # looked at, and they are decoded at most once
+        lines_examined = 0
+        for start, end in iter_matching_lines(buf, matcher):
+            lines_examined += 1
+            line_bytes = buf[start:end]
+            old_line: Optional[str] = None
+            for i, change_request in enumerate(change_requests):
+                if old_strings[i] not in line_bytes:
+                    continue
+                line_starts = searched_lines[i]
+                if line_starts is not None and start not in line_starts:
+                    continue
+                if old_line is None:
+                    old_line = line_bytes.decode()
+                old_string = change_request.old_string
+                if line_starts is None and not should_replace(
+                    old_line, old_string, change_request.search_regex
+                ):
+                    continue
+                new_line = old_line.replace(old_string, change_request.new_string)
+                replacements = [
+                    (pos, pos + len(old_strings[i]), new_strings[i])
+                    for pos in find_all(buf, old_strings[i], start, end)
+                ]
+                patch = Patch(
+                    self.working_path,
+                    expanded_src,
+                    None,
+                    old_line,
+                    new_line,
+                    replacements=replacements,
+                    line_start=start,
+                    line_counter=line_counter,
+                )
+                res[i].append(patch)
+        count(LINES_EXAMINED, lines_examined)
+        return res
 
     def compute_change_requests(self) -> List[ChangeRequest]:
         # When bumping files in a project, we need to bump:
@@ -270,4 +617,4 @@ def bump_files(new_version: str, repo_path: Optional[Path] = None) -> None:
     for i, patch in enumerate(patches):
         ui.info_count(i, n, patch.src)
         patch.print_self()
-        patch.apply()
+    apply_patches(patches, mmap_threshold=bumper.mmap_threshold)
@@ -0,0 +1,238 @@
+import fnmatch
+import glob
+import os
+import re
+from pathlib import Path, PurePosixPath
+from typing import Dict, FrozenSet, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+from tbump.git import run_git_captured
+
+# Never look inside those when expanding wildcards
+DEFAULT_IGNORED_DIRS = [".git"]
+
+# Where to look for files matching wildcards
+WALK_INDEX = "walk"
+GIT_INDEX = "git"
+INDEX_KINDS = [WALK_INDEX, GIT_INDEX]
+
+# Identifies a directory, no matter which path leads to it
+DirKey = Tuple[int, int]
+
+
+def is_hidden(name: str) -> bool:
+    return name.startswith(".")
+
+
+class GlobMatcher:
+    """Match relative paths against a glob pattern, without touching
+    the file system.
+
+    Follows the same rules as `glob.glob(..., recursive=True)`:
+
+    * `*`, `?` and `[...]` never match a path separator
+    * `**` matches zero or more directories
+    * wildcards do not match names starting with a dot, unless
+      the pattern itself starts with a dot
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.parts = split_pattern(pattern)
+        self.regexes: Dict[str, Pattern[str]] = {}
+        for part in self.parts:
+            if part != "**" and glob.has_magic(part):
+                self.regexes[part] = re.compile(fnmatch.translate(part))
+
+    def match(self, path_parts: Sequence[str]) -> bool:
+        return self._match(self.parts, path_parts)
+
+    def _match(self, pattern_parts: Sequence[str], path_parts: Sequence[str]) -> bool:
+        if not pattern_parts:
+            return not path_parts
+        head, rest = pattern_parts[0], pattern_parts[1:]
+        if head == "**":
+            # Note: we only match files, so a trailing `**` must
+            # match at least one component
+            for i in range(len(path_parts) + 1):
+                if i > 0 and is_hidden(path_parts[i - 1]):
+                    return False
+                if (rest or i > 0) and self._match(rest, path_parts[i:]):
+                    return True
+            return False
+        if not path_parts:
+            return False
+        if not self._match_name(head, path_parts[0]):
+            return False
+        return self._match(rest, path_parts[1:])
+
+    def may_enter(self, dir_parts: Sequence[str]) -> bool:
+        """Whether a file below the given directory could match.
+
+        Used to prune the directories that cannot contain any match
+        """
+        return self._may_enter(self.parts, dir_parts)
+
+    def _may_enter(
+        self, pattern_parts: Sequence[str], dir_parts: Sequence[str]
+    ) -> bool:
+        if not dir_parts:
+            return bool(pattern_parts)
+        if not pattern_parts:
+            return False
+        head, rest = pattern_parts[0], pattern_parts[1:]
+        if head == "**":
+            for i in range(len(dir_parts) + 1):
+                if i == len(dir_parts):
+                    return True
+                if self._may_enter(rest, dir_parts[i:]):
+                    return True
+                if is_hidden(dir_parts[i]):
+                    return False
+            return False
+        if not self._match_name(head, dir_parts[0]):
+            return False
+        return self._may_enter(rest, dir_parts[1:])
+
+    def _match_name(self, pattern_part: str, name: str) -> bool:
+        regex = self.regexes.get(pattern_part)
+        if not regex:
+            return pattern_part == name
+        if is_hidden(name) and not is_hidden(pattern_part):
+            return False
+        return regex.match(name) is not None
+
+
+def split_pattern(pattern: str) -> Tuple[str, ...]:
+    return PurePosixPath(pattern.replace(os.sep, "/")).parts
+
+
+def can_walk(pattern: str) -> bool:
+    """Whether the pattern can be matched against the files found below
+    the working path. Patterns going outside of it are left to `glob`
+    """
+    parts = split_pattern(pattern)
+    if not parts or parts[0] == "/" or ".." in parts:
+        return False
+    return not os.path.isabs(pattern)
+
+
+class FileIndex:
+    """Expand `src` patterns relative to a working path.
+
+    Instead of calling `glob.glob()` for each pattern, all the patterns
+    containing wildcards are matched against each file found during a
+    single walk of the working path. The walk only enters directories
+    where at least one pattern may match, and always skips `ignored_dirs`.
+
+    When `index` is "git", the files are taken from `git ls-files`
+    instead, so that untracked files (build output, virtual environments
+    and the like) are never visited.
+
+    Results are cached, so that checking that files exist and computing
+    patches do not expand the same pattern twice.
+    """
+
+    def __init__(
+        self,
+        working_path: Path,
+        patterns: Sequence[str],
+        *,
+        ignored_dirs: Optional[Sequence[str]] = None,
+        index: str = WALK_INDEX,
+    ):
+        self.working_path = working_path
+        self.index = index
+        self.ignored_dirs = set(DEFAULT_IGNORED_DIRS)
+        if ignored_dirs:
+            self.ignored_dirs.update(ignored_dirs)
+        self.matchers = [
+            GlobMatcher(x) for x in sorted(set(patterns)) if is_walkable_glob(x)
+        ]
+        self._cache: Dict[str, List[Path]] = {}
+
+    def expand(self, src: str) -> List[Path]:
+        """Return the paths matching the `src` pattern, in a stable order"""
+        if src not in self._cache:
+            self._cache[src] = self._expand(src)
+        return self._cache[src]
+
+    def _expand(self, src: str) -> List[Path]:
+        path = self.working_path / src
+        if not glob.has_magic(src):
+            return [path] if os.path.lexists(path) else []
+        if src not in {x.pattern for x in self.matchers}:
+            return [Path(x) for x in sorted(glob.glob(str(path), recursive=True))]
+        self._walk()
+        return self._cache[src]
+
+    def _walk(self) -> None:
+        results: Dict[str, List[Path]] = {x.pattern: [] for x in self.matchers}
+        if self.index == GIT_INDEX:
+            candidates = self._list_git_files()
+        else:
+            candidates = self._list_files()
+        for rel_parts in candidates:
+            for matcher in self.matchers:
+                if matcher.match(rel_parts):
+                    results[matcher.pattern].append(
+                        self.working_path.joinpath(*rel_parts)
+                    )
+        for pattern, paths in results.items():
+            if self.index == GIT_INDEX:
+                # The git index may still list files that were removed
+                # from the working tree, or submodules
+                paths = [x for x in paths if x.is_file()]
+            self._cache[pattern] = sorted(paths)
+
+    def _list_files(self) -> Iterator[Tuple[str, ...]]:
+        """Yield every file that may match one of the patterns, as a tuple
+        of path components relative to the working path
+        """
+        # For each directory to visit, the directories leading to it
+        # (itself included), to guard against symlink loops
+        ancestors: Dict[str, FrozenSet[DirKey]] = {}
+        root_key = get_dir_key(self.working_path)
+        ancestors[str(self.working_path)] = frozenset([root_key] if root_key else [])
+        for dirpath, dirnames, filenames in os.walk(
+            self.working_path, followlinks=True
+        ):
+            rel_dir = Path(dirpath).relative_to(self.working_path).parts
+            parents = ancestors.pop(dirpath)
+            kept = []
+            for name in dirnames:
+                if name in self.ignored_dirs:
+                    continue
+                if not any(m.may_enter(rel_dir + (name,)) for m in self.matchers):
+                    continue
+                key = get_dir_key(Path(dirpath, name))
+                if key is None or key in parents:
+                    continue
+                ancestors[os.path.join(dirpath, name)] = parents | {key}
+                kept.append(name)
+            dirnames[:] = kept
+            for filename in filenames:
+                yield rel_dir + (filename,)
+
+    def _list_git_files(self) -> Iterator[Tuple[str, ...]]:
+        """Yield every file known to git that may match one of the patterns"""
+        _, out = run_git_captured(self.working_path, "ls-files", "-z")
+        for name in out.split("\0"):
+            if not name:
+                continue
+            rel_parts = tuple(name.split("/"))
+            if self.ignored_dirs.intersection(rel_parts[:-1]):
+                continue
+            yield rel_parts
+
+
+def is_walkable_glob(pattern: str) -> bool:
+    return glob.has_magic(pattern) and can_walk(pattern)
+
+
+def get_dir_key(path: Path) -> Optional[DirKey]:
+    """Return None if the directory cannot be read"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
@@ -1,10 +1,13 @@
+import atexit
 import subprocess
+import threading
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import cli_ui as ui
 
 from tbump.error import Error
+from tbump.timings import SUBPROCESSES, count, phase
 
 _GIT_COMMANDS = []
 _RECORD = False
@@ -47,7 +50,9 @@ def run_git(working_path: Path, *cmd: str, verbose: bool = False) -> None:
     git_cmd = list(cmd)
     git_cmd.insert(0, "git")
 
-    returncode = subprocess.call(git_cmd, cwd=working_path)
+    with phase(" ".join(git_cmd)):
+        count(SUBPROCESSES)
+        returncode = subprocess.call(git_cmd, cwd=working_path)
     if returncode != 0:
         raise GitCommandError(cmd=git_cmd, working_path=working_path)
 
@@ -68,8 +73,12 @@ def run_git_captured(
     options["stderr"] = subprocess.STDOUT
 
     ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
-    process = subprocess.Popen(git_cmd, cwd=working_path, **options)  # type: ignore[call-overload]
-    output, _ = process.communicate()
+    with phase(" ".join(git_cmd)):
+        count(SUBPROCESSES)
+        process = subprocess.Popen(  # type: ignore[call-overload]
+            git_cmd, cwd=working_path, **options
+        )
+        output, _ = process.communicate()
     output = output.decode("utf-8")
     if output.endswith("\n"):
         output = output.strip("\n")
@@ -78,3 +87,109 @@ def run_git_captured(
     if check and returncode != 0:
         raise GitCommandError(working_path=working_path, cmd=git_cmd, output=output)
     return returncode, output
+
+
+class CatFileProcess:
+    """A long-lived `git cat-file --batch-check` process.
+
+    Used to resolve refs without spawning a new git process for
+    each query.
+    """
+
+    def __init__(self, working_path: Path):
+        self.working_path = working_path
+        self.lock = threading.Lock()
+        count(SUBPROCESSES)
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch-check"],
+            cwd=working_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """Return the object name `ref` points to, or None if it does
+        not exist.
+
+        Raise OSError if the process is gone
+        """
+        assert self.process.stdin and self.process.stdout
+        with self.lock:
+            ui.debug(ui.lightgray, self.working_path, "$", ui.reset, "cat-file", ref)
+            self.process.stdin.write(ref.encode() + b"\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline().decode()
+        if not line:
+            raise OSError("git cat-file exited unexpectedly")
+        # Either "<object> <type> <size>" or "<ref> missing"
+        parts = line.split()
+        if len(parts) != 3:
+            return None
+        return parts[0]
+
+    def close(self) -> None:
+        if self.process.stdin:
+            self.process.stdin.close()
+        self.process.wait()
+
+
+_CAT_FILE_PROCESSES: Dict[Path, CatFileProcess] = {}
+_CAT_FILE_LOCK = threading.Lock()
+
+
+def get_cat_file_process(working_path: Path) -> Optional[CatFileProcess]:
+    """Return the cat-file process for the given repository, starting it
+    if needed. Return None if it cannot be started
+    """
+    with _CAT_FILE_LOCK:
+        process = _CAT_FILE_PROCESSES.get(working_path)
+        if process is None:
+            try:
+                process = CatFileProcess(working_path)
+            except OSError:
+                return None
+            _CAT_FILE_PROCESSES[working_path] = process
+        return process
+
+
+def close_cat_file_processes() -> None:
+    with _CAT_FILE_LOCK:
+        for process in _CAT_FILE_PROCESSES.values():
+            process.close()
+        _CAT_FILE_PROCESSES.clear()
+
+
+atexit.register(close_cat_file_processes)
+
+
+def can_batch(ref: str) -> bool:
+    # cat-file reads one ref per line, and valid ref names never
+    # contain whitespace
+    return bool(ref) and not any(x.isspace() for x in ref)
+
+
+def resolve_ref(working_path: Path, ref: str) -> Optional[str]:
+    """Return the object name `ref` points to in the repository
+    at `working_path`, or None if it does not exist.
+
+    Queries are sent to a long-lived `git cat-file` process, falling
+    back to `git rev-parse` if it cannot be used.
+    """
+    process = get_cat_file_process(working_path) if can_batch(ref) else None
+    if process:
+        try:
+            return process.resolve(ref)
+        except OSError:
+            with _CAT_FILE_LOCK:
+                _CAT_FILE_PROCESSES.pop(working_path, None)
+    rc, out = run_git_captured(
+        working_path, "rev-parse", "--verify", "--quiet", ref, check=False
+    )
+    if rc != 0:
+        return None
+    return out
+
+
+def ref_exists(working_path: Path, ref: str) -> bool:
+    return resolve_ref(working_path, ref) is not None
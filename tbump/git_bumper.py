@@ -1,12 +1,12 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import cli_ui as ui
 
 from tbump.action import Action
 from tbump.config import Config
-from tbump.git import GitError, print_git_command, run_git, run_git_captured
+from tbump.git import GitError, print_git_command, ref_exists, run_git, run_git_captured
 
 
 class DirtyRepository(GitError):
@@ -61,6 +61,37 @@ class Command(Action):
         return run_git(self.repo_path, *self.cmd, verbose=False)
 
 
+@dataclass
+class RepoState:
+    """What the pre-flight checks need to know about the repository"""
+
+    # None when HEAD is detached
+    branch: Optional[str]
+    # Short name of the upstream branch, like "origin/master"
+    upstream: Optional[str]
+    # Whether tracked files have changes, staged or not
+    dirty: bool
+
+
+def parse_repo_state(status_output: str) -> RepoState:
+    """Parse the output of `git status --porcelain=v2 --branch`"""
+    branch: Optional[str] = None
+    upstream: Optional[str] = None
+    dirty = False
+    for line in status_output.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "#":
+            header, _, value = value.partition(" ")
+            if header == "branch.head" and value != "(detached)":
+                branch = value
+            elif header == "branch.upstream":
+                upstream = value
+        elif key in ("1", "2", "u"):
+            # Other lines are headers, untracked and ignored files
+            dirty = True
+    return RepoState(branch=branch, upstream=upstream, dirty=dirty)
+
+
 @dataclass
 class GitBumperOptions:
     working_path: Path
@@ -80,6 +111,8 @@ class GitBumper:
         self.remote_branch = ""
         self.operations = operations
         self.commands: List[Command] = []
+        self._repo_state: Optional[RepoState] = None
+        self._existing_refs: Dict[str, bool] = {}
 
     def get_tag_name(self, new_version: str) -> str:
         return self.tag_template.format(new_version=new_version)
@@ -101,48 +134,56 @@ class GitBumper:
     def run_git_captured(self, *args: str, check: bool = True) -> Tuple[int, str]:
         return run_git_captured(self.repo_path, *args, check=check)
 
+    def get_repo_state(self) -> RepoState:
+        """Gather branch, upstream and dirty state with a single git
+        call. The result is cached for the whole run
+        """
+        if self._repo_state is None:
+            _, out = self.run_git_captured("status", "--porcelain=v2", "--branch")
+            self._repo_state = parse_repo_state(out)
+        return self._repo_state
+
     def check_dirty(self) -> None:
         if "commit" not in self.operations:
             return
-        _, out = self.run_git_captured("status", "--porcelain")
-        dirty = False
-        for line in out.splitlines():
-            # Ignore untracked files
-            if not line.startswith("??"):
-                dirty = True
-        if dirty:
+        if self.get_repo_state().dirty:
+            # Only get the human-readable status when we need to display it
+            _, out = self.run_git_captured("status", "--porcelain")
             raise DirtyRepository(git_status_output=out)
 
     def get_current_branch(self) -> str:
-        cmd = ("rev-parse", "--abbrev-ref", "HEAD")
-        _, out = self.run_git_captured(*cmd)
-        if out == "HEAD":
+        branch = self.get_repo_state().branch
+        if branch is None:
             raise NotOnAnyBranch()
-        return out
+        return branch
 
     def get_tracking_ref(self) -> str:
         branch_name = self.get_current_branch()
-        rc, out = self.run_git_captured(
-            "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}", check=False
-        )
-        if rc != 0:
+        upstream = self.get_repo_state().upstream
+        if upstream is None:
             raise NoTrackedBranch(branch=branch_name)
-        return out
+        return upstream
+
+    def ref_exists(self, ref: str) -> bool:
+        if ref not in self._existing_refs:
+            self._existing_refs[ref] = ref_exists(self.repo_path, ref)
+        return self._existing_refs[ref]
 
     def check_ref_does_not_exists(self, tag_name: str) -> None:
-        rc, _ = self.run_git_captured("rev-parse", tag_name, check=False)
-        if rc == 0:
+        if self.ref_exists(tag_name):
             raise RefAlreadyExists(ref=tag_name)
 
     def check_branch_state(self, new_version: str) -> None:
+        self.check_branch_state_for([self.get_tag_name(new_version)])
+
+    def check_branch_state_for(self, tag_names: List[str]) -> None:
         if "commit" not in self.operations:
             return
         if "tag" in self.operations:
-            tag_name = self.get_tag_name(new_version)
-            self.check_ref_does_not_exists(tag_name)
+            for tag_name in tag_names:
+                self.check_ref_does_not_exists(tag_name)
 
         if "push_commit" in self.operations:
-            self.get_current_branch()
             tracking_ref = self.get_tracking_ref()
             self.remote_name, self.remote_branch = tracking_ref.split("/", maxsplit=1)
 
@@ -151,33 +192,40 @@ class GitBumper:
         commands.append(command)
 
     def get_commands(self, new_version: str) -> List[Command]:
+        commit_message = self.message_template.format(new_version=new_version)
+        tag_name = self.get_tag_name(new_version)
+        return self.get_commands_for(commit_message, [tag_name])
+
+    def get_commands_for(
+        self, commit_message: str, tag_names: List[str]
+    ) -> List[Command]:
+        """Commit with the given message, then create and push all the tags"""
         res: List[Command] = []
         if "commit" not in self.operations:
             return res
         self.add_command(res, "add", "--update")
-        commit_message = self.message_template.format(new_version=new_version)
         self.add_command(res, "commit", "--message", commit_message)
-        tag_name = self.get_tag_name(new_version)
         if "tag" in self.operations:
-            if self.tag_message:
-                tag_message = self.tag_message
-            else:
-                tag_message = tag_name
-
-            if not self.sign:
-                self.add_command(
-                    res, "tag", "--annotate", "--message", tag_message, tag_name
-                )
-            else:
-                self.add_command(
-                    res,
-                    "tag",
-                    "--sign",
-                    "--annotate",
-                    "--message",
-                    tag_message,
-                    tag_name,
-                )
+            for tag_name in tag_names:
+                if self.tag_message:
+                    tag_message = self.tag_message
+                else:
+                    tag_message = tag_name
+
+                if not self.sign:
+                    self.add_command(
+                        res, "tag", "--annotate", "--message", tag_message, tag_name
+                    )
+                else:
+                    self.add_command(
+                        res,
+                        "tag",
+                        "--sign",
+                        "--annotate",
+                        "--message",
+                        tag_message,
+                        tag_name,
+                    )
         if "push_commit" in self.operations and "push_tag" in self.operations:
             if self.atomic_push:
                 self.add_command(
@@ -186,16 +234,16 @@ class GitBumper:
                     "--atomic",
                     self.remote_name,
                     self.remote_branch,
-                    tag_name,
+                    *tag_names,
                 )
             else:
                 # Need to do the op separately, otherwise tag will get pushed
                 # even if branch fails
                 self.add_command(res, "push", self.remote_name, self.remote_branch)
-                self.add_command(res, "push", self.remote_name, tag_name)
+                self.add_command(res, "push", self.remote_name, *tag_names)
         elif "push_commit" in self.operations:
             self.add_command(res, "push", self.remote_name, self.remote_branch)
         elif "push_tag" in self.operations:
-            self.add_command(res, "push", self.remote_name, tag_name)
+            self.add_command(res, "push", self.remote_name, *tag_names)
         # else do nothing
         return res
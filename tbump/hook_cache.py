@@ -0,0 +1,90 @@
+import hashlib
+import os
+from contextlib import suppress
+from pathlib import Path
+from typing import Sequence
+
+from tbump.file_index import FileIndex
+
+DEFAULT_HOOK_CACHE_SIZE = 256
+
+# Bump this when the way keys are computed changes
+CACHE_VERSION = b"1"
+
+
+def get_user_cache_dir() -> Path:
+    """Return the directory where tbump caches data for the current user"""
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if cache_home:
+        return Path(cache_home) / "tbump"
+    return Path.home() / ".cache" / "tbump"
+
+
+def get_default_cache_dir() -> Path:
+    return get_user_cache_dir() / "hooks"
+
+
+def hash_file(path: Path) -> str:
+    res = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            res.update(chunk)
+    return res.hexdigest()
+
+
+class HookCache:
+    """Remember which hooks succeeded with a given command and inputs.
+
+    Each successful run is stored as an empty file named after a hash of
+    the hook command, its working path, and the contents of the files
+    matching its `inputs` patterns. Only the `max_entries` most recently
+    used entries are kept.
+    """
+
+    def __init__(self, path: Path, *, max_entries: int = DEFAULT_HOOK_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+
+    def get_key(self, cmd: str, working_path: Path, inputs: Sequence[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(CACHE_VERSION + b"\0")
+        digest.update(cmd.encode() + b"\0")
+        digest.update(str(working_path.resolve()).encode() + b"\0")
+        file_index = FileIndex(working_path, inputs)
+        for pattern in inputs:
+            digest.update(b"pattern\0" + pattern.encode() + b"\0")
+            for path in file_index.expand(pattern):
+                if not path.is_file():
+                    continue
+                rel_path = path.relative_to(working_path).as_posix()
+                digest.update(rel_path.encode() + b"\0")
+                digest.update(hash_file(path).encode() + b"\0")
+        return digest.hexdigest()
+
+    def contains(self, key: str) -> bool:
+        entry = self.path / key
+        if not entry.exists():
+            return False
+        # Mark the entry as recently used
+        entry.touch()
+        return True
+
+    def add(self, key: str) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / key).touch()
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries"""
+        entries = []
+        for entry in self.path.iterdir():
+            # Entries may be removed by hooks running concurrently
+            with suppress(FileNotFoundError):
+                entries.append((entry.stat().st_mtime, entry))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        stale = len(entries) - self.max_entries
+        for _, entry in entries[:stale]:
+            with suppress(FileNotFoundError):
+                entry.unlink()
@@ -1,19 +1,73 @@
+import os
+import signal
 import subprocess
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import suppress
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 import cli_ui as ui
 
 from tbump.action import Action
 from tbump.error import Error
+from tbump.hook_cache import HookCache
+from tbump.timings import (
+    CACHED,
+    CANCELED,
+    FAILED,
+    OK,
+    SUBPROCESSES,
+    TIMEOUT,
+    Timer,
+    count,
+    get_report,
+)
+
+# How long to wait for a hook to exit after asking it to stop,
+# before killing it
+KILL_GRACE_PERIOD = 5
 
 
 class Hook(Action):
-    def __init__(self, name: str, cmd: str):
+    def __init__(
+        self,
+        name: str,
+        cmd: str,
+        *,
+        parallel: bool = False,
+        group: Optional[str] = None,
+        needs: Optional[List[str]] = None,
+        inputs: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+    ):
         super().__init__()
         self.working_path: Optional[Path] = None
+        self.cache: Optional[HookCache] = None
         self.name = name
         self.cmd = cmd
+        self.parallel = parallel
+        self.group = group
+        self.needs = needs or []
+        self.inputs = inputs or []
+        self.timeout = timeout
+
+    @property
+    def concurrency_key(self) -> Optional[str]:
+        """Adjacent hooks with the same key may run concurrently.
+        None means the hook always runs alone
+        """
+        if self.group is not None:
+            return "group:" + self.group
+        if self.parallel:
+            return "parallel"
+        return None
+
+    @property
+    def runs_alone(self) -> bool:
+        return not self.needs and self.concurrency_key is None
 
     def print_self(self) -> None:
         ui.info(ui.darkgray, "$", ui.reset, self.cmd)
@@ -22,9 +76,108 @@ class Hook(Action):
         self.run()
 
     def run(self) -> None:
-        rc = subprocess.call(self.cmd, shell=True, cwd=self.working_path)
+        timer = Timer()
+        cache_key = self.get_cache_key()
+        if self.is_cached(cache_key):
+            self.print_cached()
+            self.record(timer, rc=0, status=CACHED)
+            return
+        count(SUBPROCESSES)
+        if self.timeout is None:
+            rc = subprocess.call(self.cmd, shell=True, cwd=self.working_path)
+        else:
+            rc = self.call_with_timeout(self.timeout, timer)
+        self.record(timer, rc=rc, status=OK if rc == 0 else FAILED)
         if rc != 0:
             raise HookError(name=self.name, cmd=self.cmd, rc=rc)
+        self.store_success(cache_key)
+
+    def call_with_timeout(self, timeout: float, timer: Timer) -> int:
+        # Only hooks that may time out get their own process group,
+        # so that the other ones can still use the terminal
+        process = subprocess.Popen(
+            self.cmd,
+            shell=True,
+            cwd=self.working_path,
+            start_new_session=os.name == "posix",
+        )
+        try:
+            return process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process)
+            self.record(timer, rc=process.returncode, status=TIMEOUT)
+            raise HookTimeout(name=self.name, cmd=self.cmd, timeout=timeout)
+        except BaseException:
+            # The hook runs in its own session, so it does not get the
+            # SIGINT sent by Ctrl-C: stop it, as subprocess.call() would
+            kill_process_group(process)
+            raise
+
+    def record(self, timer: Timer, *, rc: Optional[int], status: str) -> None:
+        report = get_report()
+        if report:
+            report.add_hook(self.name, self.cmd, timer, rc=rc, status=status)
+
+    def get_cache_key(self) -> Optional[str]:
+        """Only hooks declaring their inputs can be cached"""
+        if not self.cache or not self.inputs:
+            return None
+        working_path = self.working_path or Path.cwd()
+        return self.cache.get_key(self.cmd, working_path, self.inputs)
+
+    def is_cached(self, cache_key: Optional[str]) -> bool:
+        return bool(self.cache and cache_key and self.cache.contains(cache_key))
+
+    def store_success(self, cache_key: Optional[str]) -> None:
+        if self.cache and cache_key:
+            self.cache.add(cache_key)
+
+    def print_cached(self) -> None:
+        ui.info(ui.darkgray, "Skipping", ui.reset, self.cmd, ui.darkgray, "(cached)")
+
+    def start(self) -> "subprocess.Popen[bytes]":
+        """Start the hook in the background, capturing its output.
+
+        The hook gets its own process group, so that it can be stopped
+        along with the processes started by the shell
+        """
+        count(SUBPROCESSES)
+        return subprocess.Popen(
+            self.cmd,
+            shell=True,
+            cwd=self.working_path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=os.name == "posix",
+        )
+
+
+def stop_process_group(
+    process: "subprocess.Popen[bytes]", *, force: bool = False
+) -> None:
+    if os.name != "posix":
+        if force:
+            process.kill()
+        else:
+            process.terminate()
+        return
+    # The process may have exited in the meantime
+    with suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+
+
+def kill_process_group(process: "subprocess.Popen[bytes]") -> bytes:
+    """Stop the process group, killing it if it does not exit in time.
+
+    Return the output captured so far, if any
+    """
+    stop_process_group(process)
+    try:
+        output, _ = process.communicate(timeout=KILL_GRACE_PERIOD)
+    except subprocess.TimeoutExpired:
+        stop_process_group(process, force=True)
+        output, _ = process.communicate()
+    return output or b""
 
 
 class BeforeCommitHook(Hook):
@@ -54,15 +207,315 @@ class HookError(Error):
         ui.error(ui.reset, "`%s`" % self.cmd, "exited with return code", self.rc)
 
 
+class HookTimeout(HookError):
+    def __init__(self, *, name: str, cmd: str, timeout: float):
+        super().__init__(name=name, cmd=cmd, rc=-1)
+        self.timeout = timeout
+
+    def print_error(self) -> None:
+        ui.error(
+            ui.reset, "`%s`" % self.cmd, "timed out after", self.timeout, "seconds"
+        )
+
+
+class HookCycle(Error):
+    def __init__(self, names: List[str]):
+        super().__init__()
+        self.names = names
+
+    def print_error(self) -> None:
+        ui.error("Hooks depend on each other:", " -> ".join(self.names))
+
+
+@dataclass
+class HookResult:
+    hook: Hook
+    rc: int
+    output: bytes
+    # True if the hook was stopped because another one failed
+    canceled: bool = False
+    # True if the hook was skipped because it already succeeded
+    # with the same inputs
+    cached: bool = False
+    timed_out: bool = False
+
+    def get_error(self) -> HookError:
+        hook = self.hook
+        if self.timed_out and hook.timeout is not None:
+            return HookTimeout(name=hook.name, cmd=hook.cmd, timeout=hook.timeout)
+        return HookError(name=hook.name, cmd=hook.cmd, rc=self.rc)
+
+
+def get_hook_dependencies(hooks: Sequence[Hook]) -> List[Set[int]]:
+    """Return, for each hook, the indexes of the hooks it must wait for.
+
+    * Hooks with `needs` wait for the hooks they name, and for the last
+      hook running alone before them. Names are only looked up among the
+      hooks of the same project (that is, with the same working path),
+      since hooks of several projects are run together by `tbump batch`
+    * Adjacent hooks with the same `parallel` or `group` setting wait for
+      all the hooks before them, but not for each other
+    * Other hooks run alone: they wait for all the hooks before them,
+      and all the hooks after them wait for them
+    """
+    indexes_by_name: Dict[Tuple[Optional[Path], str], List[int]] = {}
+    for i, hook in enumerate(hooks):
+        indexes_by_name.setdefault((hook.working_path, hook.name), []).append(i)
+
+    res: List[Set[int]] = []
+    last_alone: Optional[int] = None
+    stage_key: Optional[str] = None
+    stage_start = 0
+    for i, hook in enumerate(hooks):
+        if hook.needs:
+            deps = {
+                j
+                for x in hook.needs
+                for j in indexes_by_name.get((hook.working_path, x), [])
+            }
+            if last_alone is not None:
+                deps.add(last_alone)
+            stage_key = None
+        elif hook.runs_alone:
+            deps = set(range(i))
+            last_alone = i
+            stage_key = None
+        else:
+            if hook.concurrency_key != stage_key:
+                stage_key = hook.concurrency_key
+                stage_start = i
+            deps = set(range(stage_start))
+        res.append(deps)
+    return res
+
+
+def find_cycle(dependencies: Sequence[Set[int]]) -> Optional[List[int]]:
+    """Return the indexes of hooks depending on each other, if any"""
+    visited: Set[int] = set()
+    path: List[int] = []
+
+    def visit(i: int) -> Optional[List[int]]:
+        if i in path:
+            start = path.index(i)
+            return path[start:] + [i]
+        if i in visited:
+            return None
+        visited.add(i)
+        path.append(i)
+        for j in sorted(dependencies[i]):
+            cycle = visit(j)
+            if cycle:
+                return cycle
+        path.pop()
+        return None
+
+    for i in range(len(dependencies)):
+        cycle = visit(i)
+        if cycle:
+            return cycle
+    return None
+
+
+def get_ready(
+    dependencies: Sequence[Set[int]], started: Set[int], done: Set[int]
+) -> List[int]:
+    return [
+        i
+        for i, deps in enumerate(dependencies)
+        if i not in started and deps.issubset(done)
+    ]
+
+
+def run_hooks(hooks: List[Hook], *, jobs: Optional[int] = None) -> None:
+    """Run the hooks, letting the ones that do not depend on each other
+    run concurrently, on up to `jobs` threads (defaults to the number
+    of CPUs)
+    """
+    max_workers = jobs or os.cpu_count() or 1
+    dependencies = get_hook_dependencies(hooks)
+    cycle = find_cycle(dependencies)
+    if cycle:
+        raise HookCycle([hooks[i].name for i in cycle])
+    if max_workers > 1 and not all(x.runs_alone for x in hooks):
+        HookScheduler(hooks, dependencies, max_workers=max_workers).run()
+        return
+
+    done: Set[int] = set()
+    while len(done) < len(hooks):
+        ready = get_ready(dependencies, done, done)
+        if not ready:
+            raise HookCycle([x.name for i, x in enumerate(hooks) if i not in done])
+        hooks[ready[0]].run()
+        done.add(ready[0])
+
+
+class HookScheduler:
+    """Start each hook as soon as the hooks it depends on are done.
+
+    Hooks running alone are run directly, with their output going to the
+    terminal. The output of the others is captured, and replayed in the
+    order of the hooks. As soon as a hook fails, the ones still running
+    are stopped, the ones not started yet are skipped, and HookError
+    is raised
+    """
+
+    def __init__(
+        self,
+        hooks: List[Hook],
+        dependencies: List[Set[int]],
+        *,
+        max_workers: int,
+    ):
+        self.hooks = hooks
+        self.dependencies = dependencies
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.processes: Set["subprocess.Popen[bytes]"] = set()
+        self.canceled = False
+        self.started: Set[int] = set()
+        self.done: Set[int] = set()
+        self.results: Dict[int, HookResult] = {}
+        self.next_to_replay = 0
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                failure = self.schedule(pool)
+            except BaseException:
+                # The hooks run in their own session, so they do not get
+                # the SIGINT sent by Ctrl-C: stop them, instead of waiting
+                # for them to finish when leaving the pool
+                self.cancel()
+                raise
+
+        if failure:
+            self.replay(final=True)
+            raise failure.get_error()
+
+    def schedule(self, pool: ThreadPoolExecutor) -> Optional[HookResult]:
+        """Run all the hooks, and return the result of the first one
+        that failed, if any
+        """
+        running: Dict["Future[HookResult]", int] = {}
+        failure: Optional[HookResult] = None
+        while len(self.done) < len(self.hooks):
+            ready = get_ready(self.dependencies, self.started, self.done)
+            alone = [i for i in ready if self.hooks[i].runs_alone]
+            if alone and not running:
+                self.run_alone(alone[0])
+                continue
+            for i in ready:
+                if len(running) >= self.max_workers:
+                    break
+                if not self.hooks[i].runs_alone:
+                    self.started.add(i)
+                    running[pool.submit(self.run_captured, self.hooks[i])] = i
+            if not running:
+                names = [x.name for i, x in enumerate(self.hooks) if i not in self.done]
+                raise HookCycle(names)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                result = future.result()
+                self.results[i] = result
+                self.done.add(i)
+                failed = result.rc != 0 or result.timed_out
+                if failed and not result.canceled and not failure:
+                    failure = result
+                    self.cancel()
+            if failure:
+                for future in running:
+                    future.result()
+                break
+            self.replay()
+        return failure
+
+    def run_alone(self, i: int) -> None:
+        # All the hooks before this one are done, so their
+        # output can be replayed now
+        self.replay()
+        self.started.add(i)
+        self.hooks[i].run()
+        self.done.add(i)
+
+    def run_captured(self, hook: Hook) -> HookResult:
+        timer = Timer()
+        cache_key = hook.get_cache_key()
+        if hook.is_cached(cache_key):
+            hook.record(timer, rc=0, status=CACHED)
+            return HookResult(hook, 0, b"", cached=True)
+        with self.lock:
+            if self.canceled:
+                return HookResult(hook, -1, b"", canceled=True)
+            process = hook.start()
+            self.processes.add(process)
+        timed_out = False
+        try:
+            output, _ = process.communicate(timeout=hook.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            output = kill_process_group(process)
+        with self.lock:
+            self.processes.discard(process)
+            canceled = self.canceled and not timed_out
+        rc = process.returncode
+        if canceled:
+            status = CANCELED
+        elif timed_out:
+            status = TIMEOUT
+        else:
+            status = OK if rc == 0 else FAILED
+        hook.record(timer, rc=rc, status=status)
+        if status == OK:
+            hook.store_success(cache_key)
+        return HookResult(hook, rc, output, canceled=canceled, timed_out=timed_out)
+
+    def cancel(self) -> None:
+        with self.lock:
+            self.canceled = True
+            for process in self.processes:
+                stop_process_group(process)
+
+    def replay(self, *, final: bool = False) -> None:
+        """Display the captured output of the hooks that are done, in order.
+
+        Stop at the first hook that is not done yet, unless `final`
+        is set, in which case the hooks that never ran are skipped
+        """
+        while self.next_to_replay < len(self.hooks):
+            i = self.next_to_replay
+            result = self.results.get(i)
+            if result and result.cached:
+                result.hook.print_cached()
+            elif result and not result.canceled:
+                sys.stdout.write(result.output.decode(errors="replace"))
+                sys.stdout.flush()
+            elif i not in self.done and not final:
+                return
+            self.next_to_replay += 1
+
+
 class HooksRunner:
-    def __init__(self, working_path: Path, current_version: str, operations: List[str]):
+    def __init__(
+        self,
+        working_path: Path,
+        current_version: str,
+        operations: List[str],
+        *,
+        jobs: Optional[int] = None,
+        cache: Optional[HookCache] = None,
+    ):
         self.hooks: List[Hook] = []
         self.working_path = working_path
         self.current_version = current_version
         self.operations = operations
+        self.jobs = jobs
+        self.cache = cache
 
     def add_hook(self, hook: Hook) -> None:
         hook.working_path = self.working_path
+        hook.cache = self.cache
         self.hooks.append(hook)
 
     def get_before_hooks(self, new_version: str) -> List[Hook]:
@@ -0,0 +1,189 @@
+import bisect
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Pattern, Sequence, Tuple, Union
+
+# Files bigger than this are memory-mapped instead of being read
+DEFAULT_MMAP_THRESHOLD = 32 * 1024 * 1024
+
+# Never copy more than this at once when dealing with memory-mapped files
+CHUNK_SIZE = 1024 * 1024
+
+Buffer = Union[bytes, mmap.mmap]
+
+# Replace buf[start:end] with some bytes
+Replacement = Tuple[int, int, bytes]
+
+
+@contextmanager
+def map_file(path: Path) -> Iterator[mmap.mmap]:
+    with path.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def count_newlines(buf: Buffer, start: int, end: int) -> int:
+    if isinstance(buf, bytes):
+        return buf.count(b"\n", start, end)
+    # mmap has no count() method, and slicing it makes a copy,
+    # so count chunk by chunk
+    res = 0
+    for chunk_start in range(start, end, CHUNK_SIZE):
+        chunk_end = min(chunk_start + CHUNK_SIZE, end)
+        res += buf[chunk_start:chunk_end].count(b"\n")
+    return res
+
+
+class LineCounter:
+    """Compute line numbers of byte offsets in a buffer.
+
+    Newlines are only counted between the requested offset and the
+    closest offset that was already computed, so getting the line
+    numbers of all the hits costs a single pass over the buffer.
+    """
+
+    def __init__(self, buf: Buffer):
+        self.buf = buf
+        self.offsets = [0]
+        self.linenos = [0]
+
+    def lineno(self, offset: int) -> int:
+        """Return the (0-based) line number of the given offset"""
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        known_offset = self.offsets[i]
+        res = self.linenos[i] + count_newlines(self.buf, known_offset, offset)
+        if known_offset != offset:
+            self.offsets.insert(i + 1, offset)
+            self.linenos.insert(i + 1, res)
+        return res
+
+
+def iter_matching_lines(
+    buf: Buffer, matcher: Pattern[bytes]
+) -> Iterator[Tuple[int, int]]:
+    """Yield the (start, end) offsets of each line containing a match.
+
+    `end` excludes the line ending, so that replacing buf[start:end]
+    preserves it.
+    """
+    end = -1
+    for match in matcher.finditer(buf):
+        if match.start() <= end:
+            # Several matches on the same line
+            continue
+        pos = match.start()
+        start = buf.rfind(b"\n", 0, pos) + 1
+        end = buf.find(b"\n", pos)
+        if end == -1:
+            end = len(buf)
+        content_end = end
+        if content_end > start and buf[content_end - 1] == ord("\r"):
+            content_end -= 1
+        yield start, content_end
+
+
+def get_line_span(buf: Buffer, lineno: int) -> Tuple[int, int]:
+    """Return the (start, end) offsets of the given (0-based) line"""
+    start = 0
+    for _ in range(lineno):
+        start = buf.find(b"\n", start) + 1
+        if start == 0:
+            raise IndexError(lineno)
+    end = buf.find(b"\n", start)
+    if end == -1:
+        end = len(buf)
+    if end > start and buf[end - 1] == ord("\r"):
+        end -= 1
+    return start, end
+
+
+def find_all(buf: Buffer, needle: bytes, start: int, end: int) -> Iterator[int]:
+    """Yield the offsets of the non-overlapping occurrences of needle
+    in buf[start:end], just like str.replace() would see them
+    """
+    pos = buf.find(needle, start, end)
+    while pos != -1:
+        yield pos
+        pos = buf.find(needle, pos + len(needle), end)
+
+
+def copy_range(src: BinaryIO, dest: BinaryIO, length: int) -> None:
+    while length > 0:
+        chunk = src.read(min(length, CHUNK_SIZE))
+        if not chunk:
+            return
+        dest.write(chunk)
+        length -= len(chunk)
+
+
+def rewrite_file(path: Path, replacements: Sequence[Replacement]) -> None:
+    """Replace the given (start, end) byte ranges of the file.
+
+    Unchanged regions are streamed to a temporary file, which then
+    replaces the original one, so the file is never loaded in memory.
+
+    Replacements must be sorted and must not overlap.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    tmp_path = Path(tmp_name)
+    try:
+        with path.open("rb") as src, os.fdopen(fd, "wb") as dest:
+            pos = 0
+            for start, end, new_bytes in replacements:
+                copy_range(src, dest, start - pos)
+                src.seek(end)
+                dest.write(new_bytes)
+                pos = end
+            shutil.copyfileobj(src, dest, CHUNK_SIZE)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink()
+        raise
+
+
+def merge_replacements(replacements: Sequence[Replacement]) -> List[Replacement]:
+    """Sort replacements by offset, making sure they do not overlap.
+
+    When two replacements overlap, the longest one wins. If they have
+    the same length, the last one wins, just like when applying
+    them one after the other.
+    """
+    starts: List[int] = []
+    by_start: Dict[int, Replacement] = {}
+    for replacement in replacements:
+        start, end, _ = replacement
+        i = bisect.bisect_left(starts, start)
+        # Check the previous replacement, and all the ones starting
+        # before the end of this one
+        first = i - 1 if i > 0 and by_start[starts[i - 1]][1] > start else i
+        last = i
+        while last < len(starts) and starts[last] < end:
+            last += 1
+        overlapping = [by_start[x] for x in starts[first:last]]
+        if any(x[1] - x[0] > end - start for x in overlapping):
+            continue
+        for x in overlapping:
+            del by_start[x[0]]
+        starts[first:last] = [start]
+        by_start[start] = replacement
+    return [by_start[x] for x in starts]
+
+
+def splice(buf: Buffer, replacements: Sequence[Replacement]) -> bytes:
+    """Return the contents of the buffer with the replacements applied.
+
+    Replacements must be sorted and must not overlap.
+    """
+    chunks = []
+    pos = 0
+    for start, end, new_bytes in replacements:
+        chunks.append(buf[pos:start])
+        chunks.append(new_bytes)
+        pos = end
+    chunks.append(buf[pos:])
+    return b"".join(chunks)
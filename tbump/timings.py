@@ -0,0 +1,211 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import cli_ui as ui
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows
+    resource = None  # type: ignore[assignment]
+
+# Names of the counters
+FILES_SCANNED = "files scanned"
+BYTES_READ = "bytes read"
+LINES_EXAMINED = "lines examined"
+PATCHES = "patches"
+SUBPROCESSES = "subprocesses"
+
+# Status of the hooks in the report
+OK = "ok"
+FAILED = "failed"
+TIMEOUT = "timeout"
+CACHED = "cached"
+CANCELED = "canceled"
+
+
+class Timer:
+    """Measure wall-clock time, both as timestamps and as a duration"""
+
+    def __init__(self) -> None:
+        self.start = time.time()
+        self._counter = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._counter
+
+
+def get_peak_memory() -> Optional[int]:
+    """Return the peak resident memory of the process, in bytes"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return max_rss
+    return max_rss * 1024
+
+
+@dataclass
+class PhaseTiming:
+    name: str
+    # Seconds since the epoch
+    start: float
+    end: float
+    duration: float
+
+
+@dataclass
+class HookTiming:
+    name: str
+    cmd: str
+    # Seconds since the epoch
+    start: float
+    end: float
+    duration: float
+    # None when the hook did not run
+    rc: Optional[int]
+    status: str
+
+
+class TimingReport:
+    """Collect the timings and counters of a bump.
+
+    Hooks and file scans may run concurrently, so recording is thread-safe
+    """
+
+    def __init__(self) -> None:
+        self.timer = Timer()
+        self.duration: Optional[float] = None
+        self.phases: List[PhaseTiming] = []
+        self.hooks: List[HookTiming] = []
+        self.counters: Dict[str, int] = dict.fromkeys(
+            (FILES_SCANNED, BYTES_READ, LINES_EXAMINED, PATCHES, SUBPROCESSES), 0
+        )
+        self.peak_memory: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def finish(self) -> None:
+        self.duration = self.timer.elapsed()
+        self.peak_memory = get_peak_memory()
+
+    def add_phase(self, name: str, timer: Timer) -> None:
+        duration = timer.elapsed()
+        timing = PhaseTiming(
+            name=name, start=timer.start, end=timer.start + duration, duration=duration
+        )
+        with self._lock:
+            self.phases.append(timing)
+
+    def count(self, name: str, value: int) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_hook(
+        self, name: str, cmd: str, timer: Timer, *, rc: Optional[int], status: str
+    ) -> None:
+        duration = timer.elapsed()
+        timing = HookTiming(
+            name=name,
+            cmd=cmd,
+            start=timer.start,
+            end=timer.start + duration,
+            duration=duration,
+            rc=rc,
+            status=status,
+        )
+        with self._lock:
+            self.hooks.append(timing)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "start": self.timer.start,
+            "duration": self.duration,
+            # Sorted by start time: nested phases come after their parent
+            "phases": [asdict(x) for x in sorted(self.phases, key=lambda x: x.start)],
+            "hooks": [asdict(x) for x in self.hooks],
+            "counters": self.counters,
+            "peak_memory": self.peak_memory,
+        }
+
+    def write(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def print_self(self) -> None:
+        ui.info_2("Timings")
+        for timing in sorted(self.phases, key=lambda x: x.start):
+            ui.info(ui.bold, "%8.3fs" % timing.duration, ui.reset, timing.name)
+        for hook in self.hooks:
+            # fmt: off
+            ui.info(
+                ui.bold, "%8.3fs" % hook.duration, ui.reset,
+                "hook", hook.name, ui.darkgray, "(%s)" % hook.status,
+            )
+            # fmt: on
+        if self.duration is not None:
+            ui.info(ui.bold, "%8.3fs" % self.duration, ui.reset, "total")
+        ui.info_2("Counters")
+        for name, value in self.counters.items():
+            ui.info(ui.bold, "%9d" % value, ui.reset, name)
+        if self.peak_memory is not None:
+            ui.info("Peak memory:", ui.bold, "%.1f MiB" % (self.peak_memory / 2**20))
+
+
+_REPORT: Optional[TimingReport] = None
+
+
+def get_report() -> Optional[TimingReport]:
+    """Return the report being recorded, if any"""
+    return _REPORT
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record the time spent in the block, if a report is being recorded"""
+    report = _REPORT
+    if not report:
+        yield
+        return
+    timer = Timer()
+    try:
+        yield
+    finally:
+        report.add_phase(name, timer)
+
+
+def count(name: str, value: int = 1) -> None:
+    report = _REPORT
+    if report:
+        report.count(name, value)
+
+
+@contextmanager
+def report_timings(*, display: bool, path: Optional[Path]) -> Iterator[None]:
+    """Record timings while in the block, then display them and/or
+    write them as JSON to `path`.
+
+    The report is produced even if the block raises, since failing or
+    timed-out hooks are the ones worth looking at
+    """
+    global _REPORT
+    if not display and not path:
+        yield
+        return
+    report = TimingReport()
+    previous = _REPORT
+    _REPORT = report
+    try:
+        yield
+    finally:
+        _REPORT = previous
+        report.finish()
+        if display:
+            report.print_self()
+        if path:
+            report.write(path)
@@ -0,0 +1,23 @@
+""" Fake hook used for testing concurrent hooks.
+Write <name>.stamp, then wait for <other>.stamp to exist:
+this only succeeds if the two hooks run at the same time
+"""
+
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> None:
+    name, other = sys.argv[1:]
+    Path(name + ".stamp").write_text("")
+    deadline = time.time() + 10
+    while not Path(other + ".stamp").exists():
+        if time.time() > deadline:
+            sys.exit("timed out waiting for " + other)
+        time.sleep(0.01)
+    print("done:", name)
+
+
+if __name__ == "__main__":
+    main()
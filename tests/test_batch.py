@@ -0,0 +1,184 @@
+import shutil
+from pathlib import Path
+
+import pytest
+import tomlkit
+
+from tbump.batch import (
+    NoProjectsFound,
+    discover_projects,
+    get_commit_message,
+    load_projects,
+)
+from tbump.cli import run as run_tbump
+from tbump.git import run_git, run_git_captured
+from tbump.git_bumper import DirtyRepository
+from tests.conftest import GitRecorder, file_contains, setup_remote
+
+
+@pytest.fixture
+def test_monorepo(tmp_path: Path, test_project: Path) -> Path:
+    src_path = tmp_path / "src"
+    for name in ["foo", "bar"]:
+        project_path = src_path / "packages" / name
+        shutil.copytree(test_project, project_path)
+        tbump_toml = project_path / "tbump.toml"
+        doc = tomlkit.loads(tbump_toml.read_text())
+        doc["git"]["tag_template"] = name + "-v{new_version}"  # type: ignore[index]
+        tbump_toml.write_text(tomlkit.dumps(doc))
+    run_git(src_path, "init", "--initial-branch", "master")
+    run_git(src_path, "add", ".")
+    run_git(src_path, "commit", "--message", "initial commit")
+    setup_remote(tmp_path)
+    return src_path
+
+
+def project_bumped(project_path: Path) -> bool:
+    doc = tomlkit.loads((project_path / "tbump.toml").read_text())
+    return all(
+        (
+            doc["version"]["current"] == "1.2.41-alpha-2",  # type: ignore[index]
+            file_contains(project_path / "package.json", '"version": "1.2.41-alpha-2"'),
+            file_contains(project_path / "VERSION", "1.2.41-alpha-2"),
+        )
+    )
+
+
+def test_discover_projects(test_monorepo: Path) -> None:
+    assert discover_projects(test_monorepo) == [
+        test_monorepo / "packages" / "bar",
+        test_monorepo / "packages" / "foo",
+    ]
+
+
+def test_discover_projects_skips_ignored_files(
+    test_monorepo: Path, test_project: Path
+) -> None:
+    (test_monorepo / ".gitignore").write_text("node_modules/\n")
+    shutil.copytree(test_project, test_monorepo / "node_modules" / "dep")
+    # Not committed yet, but not ignored either
+    shutil.copytree(test_project, test_monorepo / "packages" / "baz")
+
+    assert discover_projects(test_monorepo) == [
+        test_monorepo / "packages" / "bar",
+        test_monorepo / "packages" / "baz",
+        test_monorepo / "packages" / "foo",
+    ]
+
+
+def test_discover_projects_outside_git_repository(
+    tmp_path: Path, test_project: Path
+) -> None:
+    for name in ["packages/foo", ".venv/dep", "node_modules/dep"]:
+        shutil.copytree(test_project, tmp_path / name)
+
+    assert discover_projects(tmp_path) == [tmp_path / "packages" / "foo"]
+
+
+def test_no_projects_found(tmp_path: Path) -> None:
+    with pytest.raises(NoProjectsFound):
+        discover_projects(tmp_path)
+
+
+def test_load_projects_removes_duplicates(test_monorepo: Path) -> None:
+    projects = load_projects(
+        test_monorepo, [Path("packages/foo"), test_monorepo / "packages" / "foo"]
+    )
+    assert [x.path for x in projects] == [test_monorepo / "packages" / "foo"]
+
+
+def test_get_commit_message() -> None:
+    assert get_commit_message(["Bump to 1.2"], "1.2") == "Bump to 1.2"
+    assert get_commit_message(["foo 1.2", "bar 1.2"], "1.2") == (
+        "Bump 2 projects to 1.2\n\n* foo 1.2\n* bar 1.2"
+    )
+
+
+def test_batch_bump(test_monorepo: Path, git_recorder: GitRecorder) -> None:
+    _, previous_commit = run_git_captured(test_monorepo, "rev-parse", "HEAD")
+
+    run_tbump(
+        ["-C", str(test_monorepo), "batch", "1.2.41-alpha-2", "--non-interactive"]
+    )
+
+    assert project_bumped(test_monorepo / "packages" / "foo")
+    assert project_bumped(test_monorepo / "packages" / "bar")
+
+    # A single commit, using the message shared by the two projects
+    _, out = run_git_captured(test_monorepo, "log", "--format=%s", "HEAD~1..HEAD")
+    assert out == "Bump to 1.2.41-alpha-2"
+    _, parent = run_git_captured(test_monorepo, "rev-parse", "HEAD~1")
+    assert parent == previous_commit
+
+    # A single push, with all the tags
+    pushes = [x for x in git_recorder.commands() if x[0] == "push"]
+    assert pushes == [
+        [
+            "push",
+            "--atomic",
+            "origin",
+            "master",
+            "bar-v1.2.41-alpha-2",
+            "foo-v1.2.41-alpha-2",
+        ]
+    ]
+    _, out = run_git_captured(test_monorepo, "ls-remote", "--tags", "origin")
+    assert "refs/tags/bar-v1.2.41-alpha-2" in out
+    assert "refs/tags/foo-v1.2.41-alpha-2" in out
+
+
+def test_batch_bump_given_paths(test_monorepo: Path) -> None:
+    # fmt: off
+    run_tbump(
+        [
+            "-C", str(test_monorepo),
+            "batch", "1.2.41-alpha-2", "packages/foo",
+            "--non-interactive", "--only-patch",
+        ]
+    )
+    # fmt: on
+
+    assert project_bumped(test_monorepo / "packages" / "foo")
+    assert not project_bumped(test_monorepo / "packages" / "bar")
+
+
+def test_batch_bump_dirty(test_monorepo: Path) -> None:
+    (test_monorepo / "packages" / "foo" / "VERSION").write_text("dirty")
+
+    with pytest.raises(DirtyRepository):
+        run_tbump(
+            ["-C", str(test_monorepo), "batch", "1.2.41-alpha-2", "--non-interactive"]
+        )
+
+    assert not project_bumped(test_monorepo / "packages" / "bar")
+
+
+def test_batch_bump_shared_file(tmp_path: Path, test_project: Path) -> None:
+    # Both projects patch packages/SHARED, through different paths
+    packages_path = tmp_path / "packages"
+    for name in ["foo", "bar"]:
+        project_path = packages_path / name
+        shutil.copytree(test_project, project_path)
+        tbump_toml = project_path / "tbump.toml"
+        doc = tomlkit.loads(tbump_toml.read_text())
+        shared = tomlkit.table()
+        shared["src"] = "../SHARED"
+        doc["file"].append(shared)  # type: ignore[union-attr]
+        tbump_toml.write_text(tomlkit.dumps(doc))
+    shared_path = packages_path / "SHARED"
+    shared_path.write_text("version = 1.2.41-alpha-1 and 1.2.41-alpha-1\n")
+    run_git(tmp_path, "init", "--initial-branch", "master")
+    run_git(tmp_path, "add", ".")
+    run_git(tmp_path, "commit", "--message", "initial commit")
+
+    # fmt: off
+    run_tbump(
+        [
+            "-C", str(packages_path),
+            "batch", "1.2.41-alpha-10", "foo", "bar",
+            "--non-interactive", "--only-patch",
+        ]
+    )
+    # fmt: on
+
+    assert shared_path.read_text() == "version = 1.2.41-alpha-10 and 1.2.41-alpha-10\n"
@@ -1,12 +1,15 @@
+import subprocess
+import sys
 from pathlib import Path
 from typing import Any, Optional
 
 import pytest
 import tomlkit
 
-from tbump.cli import NotANewVersion, OlderNewVersion
+from tbump.cli import InvalidJobs, NotANewVersion, OlderNewVersion
 from tbump.cli import run as run_tbump
 from tbump.config import ConfigNotFound, InvalidConfig
+from tbump.config_reader import tomllib
 from tbump.error import Error
 from tbump.file_bumper import (
     BadSubstitution,
@@ -131,6 +134,39 @@ def test_get_current_version(test_repo: Path, capsys: pytest.CaptureFixture) ->
     assert captured.err == ""
 
 
+def test_get_current_version_from_pyproject(
+    test_pyproject_repo: Path, capsys: pytest.CaptureFixture
+) -> None:
+    run_tbump(["-C", str(test_pyproject_repo), "current-version"])
+    captured = capsys.readouterr()
+    assert captured.out == "0.1.0\n"
+
+
+def test_get_current_version_missing(test_repo: Path) -> None:
+    # The fast path cannot read the version, so the full config is
+    # used, and reports the error
+    toml_path = test_repo / "tbump.toml"
+    bad_toml = tomlkit.loads(toml_path.read_text())
+    del bad_toml["version"]["current"]  # type: ignore[union-attr]
+    toml_path.write_text(tomlkit.dumps(bad_toml))
+    with pytest.raises(InvalidConfig):
+        run_tbump(["-C", str(test_repo), "current-version"])
+
+
+@pytest.mark.skipif(tomllib is None, reason="no fast TOML parser available")
+def test_get_current_version_does_not_use_tomlkit(test_repo: Path) -> None:
+    code = "; ".join(
+        [
+            "import sys",
+            "from tbump.cli import main",
+            f"main(['-C', {str(test_repo)!r}, 'current-version'])",
+            "print('tomlkit' in sys.modules)",
+        ]
+    )
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert out.splitlines() == ["1.2.41-alpha-1", "False"]
+
+
 def test_end_to_end_using_tbump_toml(test_repo: Path) -> None:
     _, previous_commit = run_git_captured(test_repo, "rev-parse", "HEAD")
     run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive"])
@@ -179,6 +215,46 @@ def test_end_to_end_using_pyproject_toml(test_pyproject_repo: Path) -> None:
     assert "0.2.0" in actual
 
 
+PYPROJECT_WITH_TBUMP_FIRST = """\
+[tool.tbump.version]
+current = "0.1.0"
+regex = '(?P<major>\\d+)\\.(?P<minor>\\d+)\\.(?P<patch>\\d+)'
+
+[tool.tbump.git]
+message_template = "Bump to {new_version}"
+tag_template = "v{new_version}"
+
+[[tool.tbump.file]]
+src = "pyproject.toml"
+SEARCH
+
+[tool.poetry]
+name = "foo"
+version = "0.1.0"
+"""
+
+
+@pytest.mark.parametrize("search", ["search = 'version = \"{current_version}\"'", ""])
+def test_patching_config_file_placed_before_version(
+    tmp_path: Path, search: str
+) -> None:
+    src_path = tmp_path / "src"
+    src_path.mkdir()
+    pyproject_toml = src_path / "pyproject.toml"
+    pyproject_toml.write_text(PYPROJECT_WITH_TBUMP_FIRST.replace("SEARCH", search))
+    run_git(src_path, "init", "--initial-branch", "master")
+    run_git(src_path, "add", ".")
+    run_git(src_path, "commit", "--message", "initial commit")
+
+    # The new version is longer than the current one, so the offsets
+    # of the lines after the tbump table change
+    run_tbump(["-C", str(src_path), "0.1.10", "--non-interactive", "--only-patch"])
+
+    parsed = tomllib.loads(pyproject_toml.read_text())
+    assert parsed["tool"]["tbump"]["version"]["current"] == "0.1.10"
+    assert parsed["tool"]["poetry"]["version"] == "0.1.10"
+
+
 def test_using_specified_path(
     test_repo: Path,
 ) -> None:
@@ -201,6 +277,28 @@ def test_using_specified_path(
     assert files_bumped(test_repo, config_path=config_path)
 
 
+def test_only_patch_with_jobs(test_repo: Path) -> None:
+    _, previous_commit = run_git_captured(test_repo, "rev-parse", "HEAD")
+    # fmt: off
+    run_tbump(
+        [
+            "-C", str(test_repo),
+            "--jobs", "4",
+            "--only-patch",
+            "--non-interactive",
+            "1.2.41-alpha-2",
+        ]
+    )
+    # fmt: on
+
+    assert only_patch_done(test_repo, previous_commit)
+
+
+def test_invalid_jobs(test_repo: Path) -> None:
+    with pytest.raises(InvalidJobs):
+        run_tbump(["-C", str(test_repo), "--jobs", "0", "1.2.41-alpha-2"])
+
+
 def test_dry_run_interactive(test_repo: Path) -> None:
     _, previous_commit = run_git_captured(test_repo, "rev-parse", "HEAD")
     run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--dry-run"])
@@ -462,3 +560,21 @@ def test_tag_message(test_repo: Path, tag_message: Optional[str]) -> None:
     run_tbump(args)
 
     assert tag_created(test_repo, tag_message)
+
+
+def test_version_does_not_import_everything() -> None:
+    # Run in a fresh interpreter, since the tests import everything
+    code = "; ".join(
+        [
+            "import sys",
+            "from tbump.cli import main",
+            "main(['--version'])",
+            "print(' '.join(sorted(sys.modules)))",
+        ]
+    )
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    version, modules = out.splitlines()
+    assert version.startswith("tbump ")
+    imported = set(modules.split())
+    for name in ["cli_ui", "packaging", "schema", "tomlkit", "tbump.config"]:
+        assert name not in imported
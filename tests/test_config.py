@@ -1,11 +1,14 @@
 import re
 import textwrap
 from pathlib import Path
+from typing import Any
 
 import pytest
 import schema
 import tomlkit
 
+import tbump.config
+from tbump.cli import run as run_tbump
 from tbump.config import (
     Config,
     Field,
@@ -13,11 +16,13 @@ from tbump.config import (
     InvalidConfig,
     TbumpTomlUpdater,
     from_parsed_config,
+    get_basic_schema,
     get_config_file,
     validate_basic_schema,
     validate_config,
 )
-from tbump.hooks import HOOKS_CLASSES, BeforeCommitHook
+from tbump.config_reader import tomllib
+from tbump.hooks import HOOKS_CLASSES, AfterPushHook, BeforeCommitHook
 
 
 def test_happy_parse(test_project: Path) -> None:
@@ -175,6 +180,22 @@ def test_invalid_hook_cmd(test_config: Config) -> None:
     )
 
 
+def test_hook_needs_unknown_hook(test_config: Config) -> None:
+    test_config.hooks.append(BeforeCommitHook("lint", "true"))
+    test_config.hooks.append(AfterPushHook("publish", "true", needs=["lint"]))
+    assert_validation_error(
+        test_config, "after_push hook 'publish' needs unknown hook: 'lint'"
+    )
+
+
+def test_hook_dependency_cycle(test_config: Config) -> None:
+    test_config.hooks.append(BeforeCommitHook("build", "true", needs=["test"]))
+    test_config.hooks.append(BeforeCommitHook("test", "true", needs=["build"]))
+    assert_validation_error(
+        test_config, "before_commit hooks depend on each other: build -> test -> build"
+    )
+
+
 def test_current_version_does_not_match_expected_regex(test_config: Config) -> None:
     test_config.version_regex = re.compile(r"(\d+)\.(\d+)\.(\d+)")
     test_config.current_version = "1.42a1"
@@ -204,6 +225,37 @@ def test_invalid_regex() -> None:
     print(e)
 
 
+def test_basic_schema_is_built_once() -> None:
+    assert get_basic_schema() is get_basic_schema()
+
+
+def test_parse_performance_section(test_project: Path, tmp_path: Path) -> None:
+    tbump_toml = tmp_path / "tbump.toml"
+    contents = (test_project / "tbump.toml").read_text()
+    contents += textwrap.dedent(
+        """
+        [performance]
+        jobs = 4
+        ignored_dirs = ["node_modules"]
+        file_index = "git"
+        """
+    )
+    tbump_toml.write_text(contents)
+
+    config = get_config_file(tmp_path).get_config()
+
+    assert config.jobs == 4
+    assert config.ignored_dirs == ["node_modules"]
+    assert config.file_index == "git"
+
+
+def test_invalid_jobs(test_config: Config) -> None:
+    test_config.jobs = 0
+    assert_validation_error(
+        test_config, "performance.jobs should be a positive integer, got 0"
+    )
+
+
 def test_invalid_custom_template(test_config: Config) -> None:
     first_file = test_config.files[0]
     first_file.src = "pub.js"
@@ -277,3 +329,158 @@ def test_retro_compat_hooks() -> None:
     config = from_parsed_config(parsed.value)
     first_hook = config.hooks[0]
     assert isinstance(first_hook, BeforeCommitHook)
+
+
+def test_after_push_hook_with_inputs(test_config: Config) -> None:
+    test_config.hooks.append(AfterPushHook("publish", "true", inputs=["dist/*"]))
+    assert_validation_error(test_config, "after_push hook 'publish' cannot have inputs")
+
+
+def test_invalid_hook_cache_size(test_config: Config) -> None:
+    test_config.hook_cache_size = 0
+    assert_validation_error(
+        test_config, "performance.hook_cache_size should be a positive integer, got 0"
+    )
+
+
+def test_invalid_hook_timeout(test_config: Config) -> None:
+    test_config.hooks.append(BeforeCommitHook("lint", "true", timeout=0))
+    assert_validation_error(
+        test_config, "hook 'lint': timeout should be a positive number, got 0"
+    )
+
+
+def test_config_file_steps_run_once(test_repo: Path, mocker: Any) -> None:
+    mocker.patch("cli_ui.ask_yes_no", return_value=True)
+    parse_spy = mocker.spy(tomlkit, "loads")
+    schema_spy = mocker.spy(tbump.config, "validate_basic_schema")
+    validate_spy = mocker.spy(tbump.config, "validate_config")
+    dumps_spy = mocker.spy(tomlkit, "dumps")
+
+    # Interactive, so that the diff of the config file is displayed,
+    # before it is written
+    run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--only-patch"])
+
+    # When possible, the version is replaced without using tomlkit at all
+    expected_tomlkit_calls = 0 if tomllib else 1
+    assert parse_spy.call_count == expected_tomlkit_calls
+    assert schema_spy.call_count == 1
+    assert validate_spy.call_count == 1
+    assert dumps_spy.call_count == expected_tomlkit_calls
+    assert "1.2.41-alpha-2" in (test_repo / "tbump.toml").read_text()
+
+
+def test_set_new_version_updates_config(test_project: Path) -> None:
+    config_file = get_config_file(test_project)
+    assert config_file.get_config() is config_file.get_config()
+
+    config_file.set_new_version("1.2.41-alpha-2")
+
+    assert config_file.get_config().current_version == "1.2.41-alpha-2"
+    assert 'current = "1.2.41-alpha-2"' in config_file.new_text
+
+
+@pytest.mark.skipif(tomllib is None, reason="no fast TOML parser available")
+def test_loading_config_does_not_use_tomlkit(test_project: Path, mocker: Any) -> None:
+    parse_spy = mocker.spy(tomlkit, "loads")
+
+    get_config_file(test_project)
+
+    assert parse_spy.call_count == 0
+
+
+@pytest.mark.skipif(tomllib is None, reason="no fast TOML parser available")
+def test_version_is_replaced_in_text(test_project: Path, mocker: Any) -> None:
+    parse_spy = mocker.spy(tomlkit, "loads")
+    print_diff = mocker.patch("tbump.cli.print_diff")
+    config_file = get_config_file(test_project)
+
+    config_file.set_new_version("1.2.41-alpha-2")
+    config_file.print_self()
+
+    assert parse_spy.call_count == 0
+    old_text = config_file.old_text
+    assert config_file.new_text == old_text.replace(
+        'current = "1.2.41-alpha-1"', 'current = "1.2.41-alpha-2"'
+    )
+    print_diff.assert_called_once_with(
+        str(config_file.relative_path),
+        2,
+        'current = "1.2.41-alpha-1"',
+        'current = "1.2.41-alpha-2"',
+    )
+
+
+def test_version_is_replaced_in_pyproject(test_pyproject: Path) -> None:
+    config_file = get_config_file(test_pyproject)
+
+    config_file.set_new_version("0.2.0")
+
+    assert config_file.get_config().current_version == "0.2.0"
+    # The other sections are left alone
+    old_lines = config_file.old_text.splitlines()
+    new_lines = config_file.new_text.splitlines()
+    changed = [(x, y) for x, y in zip(old_lines, new_lines) if x != y]
+    assert changed == [('current = "0.1.0"', 'current = "0.2.0"')]
+
+
+def test_version_is_only_replaced_in_version_section(tmp_path: Path) -> None:
+    contents = textwrap.dedent(
+        """\
+        [tool.other]
+        current = "1.2.3"
+
+        [tool.tbump.version]
+        current = "1.2.3"
+        regex = '(?P<major>\\d+)\\.(?P<minor>\\d+)\\.(?P<patch>\\d+)'
+
+        [tool.tbump.git]
+        message_template = "Bump to {new_version}"
+        tag_template = "v{new_version}"
+
+        [[tool.tbump.file]]
+        src = "VERSION"
+
+        [tool.after]
+        current = "1.2.3"
+        """
+    )
+    (tmp_path / "pyproject.toml").write_text(contents)
+    config_file = get_config_file(tmp_path)
+
+    config_file.set_new_version("1.2.4")
+
+    lines = config_file.new_text.splitlines()
+    assert lines[1] == 'current = "1.2.3"'
+    assert lines[4] == 'current = "1.2.4"'
+    assert lines[-1] == 'current = "1.2.3"'
+
+
+def test_version_in_inline_table(tmp_path: Path) -> None:
+    # Not handled by the fast path, so the document is used instead
+    contents = textwrap.dedent(
+        """\
+        version = { current = "1.2", regex = '(?P<major>\\d+)\\.(?P<minor>\\d+)' }
+
+        [git]
+        message_template = "Bump to {new_version}"
+        tag_template = "v{new_version}"
+
+        [[file]]
+        src = "VERSION"
+        """
+    )
+    (tmp_path / "tbump.toml").write_text(contents)
+    config_file = get_config_file(tmp_path)
+
+    config_file.set_new_version("1.3")
+
+    assert config_file.get_config().current_version == "1.3"
+    assert 'current = "1.3"' in config_file.new_text
+
+
+def test_invalid_toml(tmp_path: Path) -> None:
+    (tmp_path / "tbump.toml").write_text('[version]\ncurrent = "1.2.3\n')
+
+    with pytest.raises(InvalidConfig):
+        get_config_file(tmp_path)
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+import pytest
+import tomlkit
+
+import tbump.config
+from tbump.config import config_to_dict, get_config_file
+from tbump.config_cache import ConfigCache
+
+HOOKS = """
+[[before_commit]]
+name = "lint"
+cmd = "true"
+parallel = true
+
+[[before_commit]]
+name = "test"
+cmd = "true"
+needs = ["lint"]
+inputs = ["*.js"]
+timeout = 2.5
+
+[[after_push]]
+name = "publish"
+cmd = "true"
+group = "publish"
+"""
+
+
+def setup_project(test_project: Path, tmp_path: Path) -> Path:
+    project_path = tmp_path / "project"
+    shutil.copytree(test_project, project_path)
+    with (project_path / "tbump.toml").open("a") as f:
+        f.write(HOOKS)
+    return project_path
+
+
+def test_unchanged_config_is_not_parsed_again(
+    test_project: Path, tmp_path: Path, mocker: Any
+) -> None:
+    project_path = setup_project(test_project, tmp_path)
+    cache = ConfigCache(tmp_path / "cache")
+    expected = get_config_file(project_path, cache=cache).get_config()
+
+    parse_spy = mocker.spy(tomlkit, "loads")
+    schema_spy = mocker.spy(tbump.config, "validate_basic_schema")
+    actual = get_config_file(project_path, cache=cache).get_config()
+
+    assert parse_spy.call_count == 0
+    assert schema_spy.call_count == 0
+    assert config_to_dict(actual) == config_to_dict(expected)
+    assert [type(x) for x in actual.hooks] == [type(x) for x in expected.hooks]
+
+
+def test_changed_config_is_read_again(test_project: Path, tmp_path: Path) -> None:
+    project_path = setup_project(test_project, tmp_path)
+    cache = ConfigCache(tmp_path / "cache")
+    config_file = get_config_file(project_path, cache=cache)
+    config_file.set_new_version("1.3.0")
+    config_file.do()
+
+    config = get_config_file(project_path, cache=cache).get_config()
+
+    assert config.current_version == "1.3.0"
+
+
+def test_contents_are_checked(test_project: Path, tmp_path: Path) -> None:
+    project_path = setup_project(test_project, tmp_path)
+    cache = ConfigCache(tmp_path / "cache")
+    get_config_file(project_path, cache=cache)
+
+    # Same size and modification time, different contents
+    tbump_toml = project_path / "tbump.toml"
+    stat = tbump_toml.stat()
+    text = tbump_toml.read_text()
+    tbump_toml.write_text(
+        text.replace('current = "1.2.41-alpha-1"', 'current = "1.2.42-alpha-1"')
+    )
+    os.utime(tbump_toml, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    config = get_config_file(project_path, cache=cache).get_config()
+
+    assert config.current_version == "1.2.42-alpha-1"
+
+
+def test_invalid_entries_are_ignored(test_project: Path, tmp_path: Path) -> None:
+    project_path = setup_project(test_project, tmp_path)
+    cache = ConfigCache(tmp_path / "cache")
+    get_config_file(project_path, cache=cache)
+    entry_path = cache.get_entry_path(project_path / "tbump.toml")
+    entry_path.write_text("not json")
+
+    config = get_config_file(project_path, cache=cache).get_config()
+
+    assert config.current_version == "1.2.41-alpha-1"
+
+
+@pytest.mark.parametrize("change", ["add_key", "remove_key", "bad_regex"])
+def test_entries_with_unexpected_data_are_replaced(
+    test_project: Path, tmp_path: Path, change: str
+) -> None:
+    project_path = setup_project(test_project, tmp_path)
+    cache = ConfigCache(tmp_path / "cache")
+    get_config_file(project_path, cache=cache)
+    entry_path = cache.get_entry_path(project_path / "tbump.toml")
+    entry = json.loads(entry_path.read_text())
+    if change == "add_key":
+        entry["data"]["new_field"] = 42
+    elif change == "remove_key":
+        del entry["data"]["files"]
+    else:
+        entry["data"]["version_regex"] = "(unbalanced"
+    entry_path.write_text(json.dumps(entry))
+
+    config = get_config_file(project_path, cache=cache).get_config()
+
+    assert config.current_version == "1.2.41-alpha-1"
+    # The entry was written again
+    tbump_toml = project_path / "tbump.toml"
+    assert cache.get(tbump_toml, tbump_toml.read_text()) == config_to_dict(config)
@@ -1,9 +1,24 @@
+import re
+import textwrap
 from pathlib import Path
+from typing import Any, List
 
 import pytest
+import tomlkit
 
 from tbump.config import get_config_file
-from tbump.file_bumper import BadSubstitution, CurrentVersionNotFound, FileBumper, Patch
+from tbump.file_bumper import (
+    BadSubstitution,
+    CurrentVersionNotFound,
+    FileBumper,
+    FileChanged,
+    Patch,
+    apply_patches,
+    compile_buffer_search,
+    find_searched_lines,
+    should_replace,
+)
+from tbump.scanner import DEFAULT_MMAP_THRESHOLD
 from tests.conftest import file_contains
 
 
@@ -22,6 +37,37 @@ def test_file_bumper_simple(test_repo: Path) -> None:
     assert file_contains(test_repo / "glob-two.v", 'version_two = "1.2.41-alpha-2"')
 
 
+def test_file_bumper_with_several_jobs(test_repo: Path) -> None:
+    config = get_config_file(test_repo).get_config()
+    sequential_bumper = FileBumper(test_repo, config)
+    concurrent_bumper = FileBumper(test_repo, config, jobs=4)
+
+    expected = sequential_bumper.get_patches(new_version="1.2.41-alpha-2")
+    actual = concurrent_bumper.get_patches(new_version="1.2.41-alpha-2")
+
+    assert [(x.src, x.lineno, x.new_line) for x in actual] == [
+        (x.src, x.lineno, x.new_line) for x in expected
+    ]
+
+
+def test_file_bumper_with_large_files(test_repo: Path, tmp_path: Path) -> None:
+    config = get_config_file(test_repo).get_config()
+    expected = FileBumper(test_repo, config).get_patches(new_version="1.2.41-alpha-2")
+    config.mmap_threshold = 1
+    bumper = FileBumper(test_repo, config)
+
+    actual = bumper.get_patches(new_version="1.2.41-alpha-2")
+    assert all(x.replacements for x in actual)
+    assert [(x.src, x.lineno, x.old_line, x.new_line) for x in actual] == [
+        (x.src, x.lineno, x.old_line, x.new_line) for x in expected
+    ]
+
+    apply_patches(actual)
+    assert file_contains(test_repo / "package.json", '"version": "1.2.41-alpha-2"')
+    assert file_contains(test_repo / "package.json", '"other-dep": "1.2.41-alpha-1"')
+    assert file_contains(test_repo / "glob-one.c", 'version_one = "1.2.41-alpha-2"')
+
+
 def test_patcher_preserve_endings(tmp_path: Path) -> None:
     foo_txt = tmp_path / "foo.txt"
     old_contents = b"line 1\r\nv=42\r\nline3\r\n"
@@ -33,8 +79,33 @@ def test_patcher_preserve_endings(tmp_path: Path) -> None:
     assert actual_contents == expected_contents
 
 
-def test_file_bumper_preserve_endings(test_repo: Path) -> None:
+def test_apply_patches_matches_applying_one_by_one(tmp_path: Path) -> None:
+    old_contents = b"v=42\r\nfoo\nv=42\nv=42"
+    one_by_one = tmp_path / "one_by_one.txt"
+    at_once = tmp_path / "at_once.txt"
+    one_by_one.write_bytes(old_contents)
+    at_once.write_bytes(old_contents)
+
+    def make_patches(src: str) -> List[Patch]:
+        return [
+            Patch(tmp_path, src, 0, "v=42", "v=43"),
+            Patch(tmp_path, src, 2, "v=42", "v=43"),
+            Patch(tmp_path, src, 3, "v=42", "v=43"),
+            Patch(tmp_path, src, 3, "v=42", "v=44"),
+        ]
+
+    for patch in make_patches("one_by_one.txt"):
+        patch.apply()
+    apply_patches(make_patches("at_once.txt"))
+
+    assert at_once.read_bytes() == one_by_one.read_bytes()
+    assert at_once.read_bytes() == b"v=43\r\nfoo\nv=43\nv=44"
+
+
+@pytest.mark.parametrize("mmap_threshold", [1, DEFAULT_MMAP_THRESHOLD])
+def test_file_bumper_preserve_endings(test_repo: Path, mmap_threshold: int) -> None:
     bumper = _bumper_for(test_repo)
+    bumper.mmap_threshold = mmap_threshold
     package_json = test_repo / "package.json"
 
     # Make sure package.json contain CRLF line endings
@@ -42,8 +113,7 @@ def test_file_bumper_preserve_endings(test_repo: Path) -> None:
     package_json.write_bytes(b"\r\n".join([x.encode() for x in lines]))
 
     patches = bumper.get_patches(new_version="1.2.41-alpha-2")
-    for patch in patches:
-        patch.apply()
+    apply_patches(patches)
 
     actual = package_json.read_bytes()
     assert b'version": "1.2.41-alpha-2",\r\n' in actual
@@ -200,6 +270,172 @@ def test_changing_same_file_twice(tmp_path: Path) -> None:
     assert file_contains(tmp_path / foo_c, '#define PUBLIC_VERSION "1.3"')
 
 
+def test_scan_each_file_once(tmp_path: Path, mocker: Any) -> None:
+    tbump_path = tmp_path / "tbump.toml"
+    tbump_path.write_text(
+        r"""
+        [version]
+        current = "1.2.3"
+        regex = '(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)'
+
+        [git]
+        message_template = "Bump to {new_version}"
+        tag_template = "v{new_version}"
+
+        [[file]]
+        src = "foo.c"
+        version_template = "{major}.{minor}"
+        search = "PUBLIC_VERSION"
+
+        [[file]]
+        src = "foo.c"
+        search = "FULL_VERSION"
+
+        [[file]]
+        src = "*.c"
+        search = "FULL_VERSION"
+        """
+    )
+    foo_c = tmp_path / "foo.c"
+    foo_c.write_text(
+        """
+        #define FULL_VERSION "1.2.3"
+        #define PUBLIC_VERSION "1.2"
+        """
+    )
+    bumper = _bumper_for(tmp_path)
+    scan_file = mocker.spy(bumper, "scan_file")
+
+    patches = bumper.get_patches(new_version="1.3.0")
+
+    assert scan_file.call_count == 1
+    assert [(x.lineno, x.new_line.strip()) for x in patches] == [
+        (2, '#define PUBLIC_VERSION "1.3"'),
+        (1, '#define FULL_VERSION "1.3.0"'),
+        (1, '#define FULL_VERSION "1.3.0"'),
+    ]
+
+
+def test_several_replacements_on_the_same_line(tmp_path: Path) -> None:
+    tbump_path = tmp_path / "tbump.toml"
+    tbump_path.write_text(
+        r"""
+        [version]
+        current = "1.2.3"
+        regex = '(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)'
+
+        [git]
+        message_template = "Bump to {new_version}"
+        tag_template = "v{new_version}"
+
+        [[file]]
+        src = "foo.txt"
+
+        [[file]]
+        src = "foo.txt"
+        version_template = "{major}.{minor}"
+        """
+    )
+    foo_txt = tmp_path / "foo.txt"
+    foo_txt.write_text("full: 1.2.3, public: 1.2\r\n")
+    bumper = _bumper_for(tmp_path)
+
+    patches = bumper.get_patches(new_version="1.3.0")
+    apply_patches(patches)
+
+    assert foo_txt.read_bytes() == b"full: 1.3.0, public: 1.3\r\n"
+
+
+@pytest.mark.parametrize(
+    "search",
+    [
+        '"version": "{current_version}"',
+        "^version = {current_version}$",
+        "version\\s*=\\s*{current_version}",
+        "(?<!other_)version = {current_version}",
+    ],
+)
+def test_search_whole_buffer(tmp_path: Path, search: str) -> None:
+    lines = [
+        '"version": "1.2.3",',
+        '"dep": "1.2.3",',
+        "version = 1.2.3",
+        "  version = 1.2.3",
+        "other_version = 1.2.3",
+        "version =",
+        "1.2.3",
+    ]
+    foo_txt = tmp_path / "foo.txt"
+    foo_txt.write_text("\n".join(lines))
+    tbump_toml = tmp_path / "tbump.toml"
+    tbump_toml.write_text(
+        textwrap.dedent(
+            """
+            [version]
+            current = "1.2.3"
+            regex = '.*'
+
+            [git]
+            message_template = "Bump to {new_version}"
+            tag_template = "v{new_version}"
+
+            [[file]]
+            src = "foo.txt"
+            """
+        )
+    )
+    doc = tomlkit.loads(tbump_toml.read_text())
+    doc["file"][0]["search"] = search  # type: ignore[index]
+    tbump_toml.write_text(tomlkit.dumps(doc))
+    bumper = _bumper_for(tmp_path)
+
+    patches = bumper.get_patches(new_version="1.3.0")
+
+    regex = search.format(current_version=re.escape("1.2.3"))
+    expected = [i for i, x in enumerate(lines) if should_replace(x, "1.2.3", regex)]
+    assert [x.lineno for x in patches] == expected
+
+
+def test_find_searched_lines() -> None:
+    regex = compile_buffer_search("^version = 1")
+    assert regex
+    assert find_searched_lines(b"version = 1\nfoo\nversion = 1\n", regex) == {0, 16}
+    # Carriage returns and non-ASCII contents: must search line by line
+    assert find_searched_lines(b"version = 1\r\n", regex) is None
+    assert find_searched_lines("version = 1 é".encode(), regex) is None
+    # Lookarounds could see the neighbouring lines
+    assert compile_buffer_search("(?<!foo)version") is None
+
+
 def _bumper_for(working_path: Path) -> FileBumper:
     config_file = get_config_file(working_path)
     return FileBumper(working_path, config_file.get_config())
+
+
+def test_file_changed_after_scan(tmp_path: Path) -> None:
+    tbump_path = tmp_path / "tbump.toml"
+    tbump_path.write_text(
+        r"""
+        [version]
+        current = "1.2.3"
+        regex = '(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)'
+
+        [git]
+        message_template = "Bump to {new_version}"
+        tag_template = "v{new_version}"
+
+        [[file]]
+        src = "foo.txt"
+        """
+    )
+    foo_txt = tmp_path / "foo.txt"
+    foo_txt.write_text("v=1.2.3\n")
+    bumper = _bumper_for(tmp_path)
+    patches = bumper.get_patches(new_version="1.2.4")
+    # Shift the scanned line
+    foo_txt.write_text("# comment\nv=1.2.3\n")
+
+    with pytest.raises(FileChanged):
+        apply_patches(patches)
+
+    assert foo_txt.read_text() == "# comment\nv=1.2.3\n"
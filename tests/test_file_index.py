@@ -0,0 +1,126 @@
+import glob
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from tbump.file_index import GIT_INDEX, FileIndex
+from tbump.git import run_git
+
+PATHS = [
+    "VERSION",
+    "setup.py",
+    ".hidden.py",
+    "src/foo/__init__.py",
+    "src/foo/version.py",
+    "src/bar/__init__.py",
+    "src/.cache/version.py",
+    "docs/conf.py",
+    "packages/a/package.json",
+    "packages/b/package.json",
+    "packages/b/node_modules/dep/package.json",
+]
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    for path in PATHS:
+        full_path = tmp_path / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_text("")
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "VERSION",
+        "nosuchfile",
+        "*.py",
+        ".*.py",
+        "src/*/version.py",
+        "src/**/version.py",
+        "src/**/*.py",
+        "src/**",
+        "**/*.py",
+        "**/package.json",
+        "packages/[ab]/package.json",
+        "packages/?/package.json",
+        "src/.*/*.py",
+    ],
+)
+def test_same_results_as_glob(tree: Path, pattern: str) -> None:
+    file_index = FileIndex(tree, [pattern])
+    expected = sorted(
+        Path(x)
+        for x in glob.glob(str(tree / pattern), recursive=True)
+        if Path(x).is_file()
+    )
+    assert file_index.expand(pattern) == expected
+
+
+def test_walk_once_for_all_patterns(tree: Path, mocker: Any) -> None:
+    patterns = ["*.py", "src/**/*.py", "packages/*/package.json"]
+    walk = mocker.spy(FileIndex, "_walk")
+    file_index = FileIndex(tree, patterns)
+
+    for pattern in patterns:
+        assert file_index.expand(pattern)
+    for pattern in patterns:
+        assert file_index.expand(pattern)
+
+    assert walk.call_count == 1
+
+
+def test_skip_ignored_dirs(tree: Path) -> None:
+    file_index = FileIndex(tree, ["**/package.json"], ignored_dirs=["node_modules"])
+    actual = file_index.expand("**/package.json")
+    expected: List[Path] = [
+        tree / "packages/a/package.json",
+        tree / "packages/b/package.json",
+    ]
+    assert actual == expected
+
+
+def test_do_not_walk_unrelated_dirs(tree: Path) -> None:
+    file_index = FileIndex(tree, ["src/*/version.py"])
+    visited = list(file_index._list_files())
+    visited_dirs = {parts[0] for parts in visited if len(parts) > 1}
+    assert visited_dirs == {"src"}
+    assert ("src", ".cache", "version.py") not in visited
+
+
+def test_use_git_index(tree: Path) -> None:
+    run_git(tree, "init", "--initial-branch", "master")
+    run_git(tree, "add", "src", "packages/a")
+    run_git(tree, "rm", "--cached", "--quiet", "src/bar/__init__.py")
+    (tree / "src/foo/version.py").unlink()
+    file_index = FileIndex(tree, ["**/*.py", "**/package.json"], index=GIT_INDEX)
+
+    assert file_index.expand("**/*.py") == [tree / "src/foo/__init__.py"]
+    assert file_index.expand("**/package.json") == [tree / "packages/a/package.json"]
+
+
+def test_symlinked_dirs_seen_through_several_paths(tmp_path: Path) -> None:
+    for name in ["one.txt", "two.txt", "three.txt"]:
+        (tmp_path / "a").mkdir(exist_ok=True)
+        (tmp_path / "a" / name).write_text("")
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "link").symlink_to("../a", target_is_directory=True)
+    expected = sorted(glob.glob(str(tmp_path / "d/**/*.txt"), recursive=True))
+    assert len(expected) == 3
+
+    # Results do not depend on the other patterns
+    for patterns in [["d/**/*.txt"], ["a/*.txt", "d/**/*.txt"]]:
+        file_index = FileIndex(tmp_path, patterns)
+        assert [str(x) for x in file_index.expand("d/**/*.txt")] == expected
+
+
+def test_symlink_loop(tmp_path: Path) -> None:
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "version.txt").write_text("")
+    (tmp_path / "a" / "b" / "loop").symlink_to("..", target_is_directory=True)
+
+    file_index = FileIndex(tmp_path, ["**/version.txt"])
+
+    assert file_index.expand("**/version.txt") == [tmp_path / "a/b/version.txt"]
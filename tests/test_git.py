@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+import tbump.git
+from tbump.git import ref_exists, resolve_ref, run_git, run_git_captured
+
+
+def test_resolve_ref(test_repo: Path) -> None:
+    _, head = run_git_captured(test_repo, "rev-parse", "HEAD")
+
+    assert resolve_ref(test_repo, "HEAD") == head
+    assert resolve_ref(test_repo, "master") == head
+    assert resolve_ref(test_repo, "no-such-ref") is None
+
+
+def test_sees_refs_created_after_start(test_repo: Path) -> None:
+    assert not ref_exists(test_repo, "v1.2.42")
+
+    run_git(test_repo, "tag", "v1.2.42")
+
+    assert ref_exists(test_repo, "v1.2.42")
+
+
+def test_reuses_the_same_process(test_repo: Path, mocker: MockerFixture) -> None:
+    spy = mocker.spy(tbump.git, "run_git_captured")
+    for ref in ["HEAD", "master", "v1.2.42", "v1.2.43"]:
+        resolve_ref(test_repo, ref)
+
+    assert spy.call_count == 0
+
+
+def test_falls_back_to_rev_parse(test_repo: Path, mocker: MockerFixture) -> None:
+    mocker.patch("tbump.git.get_cat_file_process", return_value=None)
+    _, head = run_git_captured(test_repo, "rev-parse", "HEAD")
+
+    assert resolve_ref(test_repo, "HEAD") == head
+    assert resolve_ref(test_repo, "no-such-ref") is None
+
+
+def test_restarts_dead_process(test_repo: Path) -> None:
+    process = tbump.git.get_cat_file_process(test_repo)
+    assert process
+    process.process.kill()
+    process.process.wait()
+
+    assert ref_exists(test_repo, "HEAD")
+    assert tbump.git.get_cat_file_process(test_repo) is not process
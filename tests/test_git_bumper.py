@@ -3,14 +3,19 @@ from pathlib import Path
 from typing import Optional
 
 import pytest
+from pytest_mock import MockerFixture
 
+import tbump.git_bumper
 from tbump.config import get_config_file
 from tbump.git import run_git, run_git_captured
 from tbump.git_bumper import (
+    DirtyRepository,
     GitBumper,
     GitBumperOptions,
     NotOnAnyBranch,
     NoTrackedBranch,
+    RepoState,
+    parse_repo_state,
 )
 
 
@@ -71,3 +76,49 @@ def test_not_on_any_branch(test_repo: Path, test_git_bumper: GitBumper) -> None:
     with pytest.raises(NotOnAnyBranch):
         test_git_bumper.check_dirty()
         test_git_bumper.check_branch_state("1.2.42")
+
+
+def test_parse_repo_state() -> None:
+    out = "\n".join(
+        [
+            "# branch.oid 0123456789abcdef0123456789abcdef01234567",
+            "# branch.head feature/foo",
+            "# branch.upstream origin/feature/foo",
+            "# branch.ab +0 -0",
+            "? untracked.txt",
+        ]
+    )
+    state = parse_repo_state(out)
+    assert state == RepoState(
+        branch="feature/foo", upstream="origin/feature/foo", dirty=False
+    )
+
+    state = parse_repo_state("# branch.head (detached)\n1 .M N... a b c d e f.txt")
+    assert state == RepoState(branch=None, upstream=None, dirty=True)
+
+
+def test_pre_flight_checks_spawn_few_git_processes(
+    test_git_bumper: GitBumper, mocker: MockerFixture
+) -> None:
+    spy = mocker.spy(tbump.git_bumper, "run_git_captured")
+    test_git_bumper.check_dirty()
+    test_git_bumper.check_branch_state("1.2.42")
+    test_git_bumper.check_branch_state("1.2.42")
+
+    # Tags are resolved by a long-lived git process, so only the
+    # status spawns a new one
+    assert spy.call_count == 1
+    assert test_git_bumper.remote_name == "origin"
+    assert test_git_bumper.remote_branch == "master"
+
+
+def test_dirty_repository(test_repo: Path, test_git_bumper: GitBumper) -> None:
+    (test_repo / "VERSION").write_text("1.2.42")
+    (test_repo / "untracked.txt").write_text("not a problem")
+
+    with pytest.raises(DirtyRepository) as e:
+        test_git_bumper.check_dirty()
+    assert e.value.git_status_output.splitlines() == [
+        " M VERSION",
+        "?? untracked.txt",
+    ]
@@ -0,0 +1,41 @@
+import os
+from pathlib import Path
+
+from tbump.hook_cache import HookCache
+
+
+def test_key_depends_on_inputs(tmp_path: Path) -> None:
+    cache = HookCache(tmp_path / "cache")
+    (tmp_path / "a.txt").write_text("a")
+    key = cache.get_key("lint", tmp_path, ["*.txt"])
+
+    assert cache.get_key("lint", tmp_path, ["*.txt"]) == key
+    assert cache.get_key("test", tmp_path, ["*.txt"]) != key
+
+    (tmp_path / "a.txt").write_text("b")
+    assert cache.get_key("lint", tmp_path, ["*.txt"]) != key
+
+
+def test_key_depends_on_file_names(tmp_path: Path) -> None:
+    cache = HookCache(tmp_path / "cache")
+    (tmp_path / "a.txt").write_text("a")
+    key = cache.get_key("lint", tmp_path, ["*.txt"])
+
+    (tmp_path / "a.txt").rename(tmp_path / "b.txt")
+    assert cache.get_key("lint", tmp_path, ["*.txt"]) != key
+
+
+def test_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = HookCache(tmp_path / "cache", max_entries=2)
+    cache.add("one")
+    cache.add("two")
+    os.utime(cache.path / "one", (1, 1))
+    os.utime(cache.path / "two", (2, 2))
+    # Using "one" makes "two" the least recently used entry
+    assert cache.contains("one")
+
+    cache.add("three")
+
+    assert cache.contains("one")
+    assert not cache.contains("two")
+    assert cache.contains("three")
@@ -1,15 +1,32 @@
+import json
+import os
+import signal
 import sys
+import threading
+import time
 from pathlib import Path
+from typing import Any
 
 import pytest
 import tomlkit
 
 from tbump.cli import run as run_tbump
 from tbump.git import run_git
-from tbump.hooks import HookError
+from tbump.hook_cache import HookCache
+from tbump.hooks import (
+    BeforeCommitHook,
+    HookCycle,
+    HookError,
+    HookTimeout,
+    find_cycle,
+    get_hook_dependencies,
+    run_hooks,
+)
 
 
-def add_hook(test_repo: Path, name: str, cmd: str, after_push: bool = False) -> None:
+def add_hook(
+    test_repo: Path, name: str, cmd: str, after_push: bool = False, **options: Any
+) -> None:
     """Patch the configuration file so that we can also test hooks."""
     cfg_path = test_repo / "tbump.toml"
     parsed = tomlkit.loads(cfg_path.read_text())
@@ -22,6 +39,8 @@ def add_hook(test_repo: Path, name: str, cmd: str, after_push: bool = False) ->
     hook_config = tomlkit.table()
     hook_config.add("cmd", cmd)
     hook_config.add("name", name)
+    for option, value in options.items():
+        hook_config.add(option, value)
     parsed[key].append(hook_config)  # type: ignore[arg-type, call-arg,  union-attr]
     cfg_path.write_text(tomlkit.dumps(parsed))
     run_git(test_repo, "add", ".")
@@ -87,3 +106,357 @@ def test_hooks_after_push(test_repo: Path) -> None:
     run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive"])
     assert (test_repo / "before-hook.stamp").exists()
     assert (test_repo / "after-hook.stamp").exists()
+
+
+def set_hook_jobs(test_repo: Path, hook_jobs: int) -> None:
+    cfg_path = test_repo / "tbump.toml"
+    parsed = tomlkit.loads(cfg_path.read_text())
+    parsed["performance"] = {"hook_jobs": hook_jobs}
+    cfg_path.write_text(tomlkit.dumps(parsed))
+    run_git(test_repo, "commit", "--all", "--message", "set hook_jobs")
+
+
+def add_rendezvous_hooks(test_repo: Path, **options: Any) -> None:
+    """Add two hooks that can only succeed if they run concurrently"""
+    set_hook_jobs(test_repo, 2)
+    for name, other in [("one", "two"), ("two", "one")]:
+        cmd = f"{sys.executable} rendezvous.py {name} {other}"
+        add_hook(test_repo, name, cmd, **options)
+
+
+def make_hook(name: str, cmd: str = "true", **options: Any) -> BeforeCommitHook:
+    return BeforeCommitHook(name, cmd, **options)
+
+
+def test_get_hook_dependencies() -> None:
+    hooks = [
+        make_hook("a"),
+        make_hook("b", parallel=True),
+        make_hook("c", parallel=True),
+        make_hook("d", group="checks"),
+        make_hook("e", group="checks"),
+        make_hook("f", needs=["b"]),
+        make_hook("g", needs=["a", "f"]),
+        make_hook("h"),
+    ]
+    assert get_hook_dependencies(hooks) == [
+        set(),
+        {0},
+        {0},
+        {0, 1, 2},
+        {0, 1, 2},
+        {0, 1},
+        {0, 5},
+        {0, 1, 2, 3, 4, 5, 6},
+    ]
+
+
+def test_find_cycle() -> None:
+    assert find_cycle([set(), {0}, {1}]) is None
+    assert find_cycle([{2}, {0}, {1}]) == [0, 2, 1, 0]
+    assert find_cycle([set(), {1}]) == [1, 1]
+
+
+def test_needs_only_refers_to_hooks_of_the_same_project(tmp_path: Path) -> None:
+    # As in `tbump batch`, with the hooks of two projects using the same names
+    hooks = [
+        make_hook("build", "echo a > build.txt"),
+        make_hook("pub", "cat build.txt > pub.txt", needs=["build"]),
+        make_hook("build", "echo b > build.txt", parallel=True),
+        make_hook("test", "cat build.txt > test.txt", needs=["build"]),
+    ]
+    for hook, name in zip(hooks, ["a", "a", "b", "b"]):
+        hook.working_path = tmp_path / name
+        hook.working_path.mkdir(exist_ok=True)
+
+    assert get_hook_dependencies(hooks) == [set(), {0}, {0, 1}, {0, 2}]
+    run_hooks(hooks, jobs=2)
+
+    assert (tmp_path / "a" / "pub.txt").read_text() == "a\n"
+    assert (tmp_path / "b" / "test.txt").read_text() == "b\n"
+
+
+def test_hook_cycle() -> None:
+    hooks = [
+        make_hook("build", needs=["test"]),
+        make_hook("test", needs=["build"]),
+    ]
+
+    with pytest.raises(HookCycle) as e:
+        run_hooks(hooks, jobs=2)
+
+    assert e.value.names == ["build", "test", "build"]
+
+
+def test_hooks_with_needs(tmp_path: Path) -> None:
+    rendezvous = Path(__file__).parent / "project" / "rendezvous.py"
+    hooks = [
+        # The two branches (build-x -> publish-x) only succeed if they
+        # run concurrently
+        make_hook("build-one", f"{sys.executable} {rendezvous} one two", parallel=True),
+        make_hook("build-two", f"{sys.executable} {rendezvous} two one", parallel=True),
+        make_hook("publish-one", "echo one > publish-one.txt", needs=["build-one"]),
+        make_hook("publish-two", "echo two > publish-two.txt", needs=["build-two"]),
+    ]
+    for hook in hooks:
+        hook.working_path = tmp_path
+
+    run_hooks(hooks, jobs=2)
+
+    assert (tmp_path / "publish-one.txt").read_text() == "one\n"
+    assert (tmp_path / "publish-two.txt").read_text() == "two\n"
+
+
+def test_needs_waits_for_dependencies(tmp_path: Path) -> None:
+    hooks = [
+        make_hook("build", "sleep 0.2 && echo built > built.txt", parallel=True),
+        make_hook("lint", "true", parallel=True),
+        make_hook("publish", "cat built.txt > published.txt", needs=["build"]),
+    ]
+    for hook in hooks:
+        hook.working_path = tmp_path
+
+    run_hooks(hooks, jobs=2)
+
+    assert (tmp_path / "published.txt").read_text() == "built\n"
+
+
+def test_failing_dependency(tmp_path: Path) -> None:
+    hooks = [
+        make_hook("build", "false", parallel=True),
+        make_hook("other", "true", parallel=True),
+        make_hook("publish", "touch published.txt", needs=["build"]),
+    ]
+    for hook in hooks:
+        hook.working_path = tmp_path
+
+    with pytest.raises(HookError) as e:
+        run_hooks(hooks, jobs=2)
+
+    assert e.value.name == "build"
+    assert not (tmp_path / "published.txt").exists()
+
+
+def test_parallel_hooks(test_repo: Path, capfd: pytest.CaptureFixture) -> None:
+    add_rendezvous_hooks(test_repo, parallel=True)
+
+    run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive"])
+
+    # Outputs are replayed in the order of the hooks
+    out = capfd.readouterr().out
+    assert out.index("done: one") < out.index("done: two")
+
+
+def test_grouped_hooks(test_repo: Path) -> None:
+    add_rendezvous_hooks(test_repo, group="checks")
+
+    run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive"])
+
+
+def test_parallel_hook_fails(test_repo: Path) -> None:
+    set_hook_jobs(test_repo, 2)
+    add_hook(
+        test_repo, "crashing hook", sys.executable + " nosuchfile.py", parallel=True
+    )
+    add_hook(
+        test_repo,
+        "slow hook",
+        sys.executable + " -c 'import time; time.sleep(30)'",
+        parallel=True,
+    )
+    add_before_hook(test_repo)
+
+    start = time.time()
+    with pytest.raises(HookError) as e:
+        run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive"])
+
+    assert e.value.name == "crashing hook"
+    # The slow hook was stopped, and the next ones never ran
+    assert time.time() - start < 20
+    assert not (test_repo / "before-hook.stamp").exists()
+
+
+def test_needs_in_config(test_repo: Path) -> None:
+    set_hook_jobs(test_repo, 2)
+    add_hook(test_repo, "build", "echo built > built.stamp", parallel=True)
+    add_hook(test_repo, "publish", "cp built.stamp published.stamp", needs=["build"])
+
+    run_tbump(["-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive"])
+
+    assert (test_repo / "published.stamp").read_text() == "built\n"
+
+
+def make_cached_hooks(tmp_path: Path, cache: HookCache) -> None:
+    """Run a hook counting its runs, with `src/*.py` as inputs"""
+    hook = make_hook("lint", "echo run >> runs.txt", inputs=["src/*.py"], parallel=True)
+    hook.working_path = tmp_path
+    hook.cache = cache
+    run_hooks([hook], jobs=1)
+
+
+def test_cached_hook(tmp_path: Path) -> None:
+    cache = HookCache(tmp_path / "cache")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "foo.py").write_text("foo = 1\n")
+
+    make_cached_hooks(tmp_path, cache)
+    make_cached_hooks(tmp_path, cache)
+    assert (tmp_path / "runs.txt").read_text() == "run\n"
+
+    (tmp_path / "src" / "foo.py").write_text("foo = 2\n")
+    make_cached_hooks(tmp_path, cache)
+    assert (tmp_path / "runs.txt").read_text() == "run\nrun\n"
+
+
+def test_cached_hooks_run_concurrently(tmp_path: Path) -> None:
+    cache = HookCache(tmp_path / "cache")
+    hooks = [
+        make_hook("one", "echo one >> runs.txt", inputs=["*.cfg"], parallel=True),
+        make_hook("two", "echo two >> runs.txt", inputs=["*.cfg"], parallel=True),
+    ]
+    for hook in hooks:
+        hook.working_path = tmp_path
+        hook.cache = cache
+
+    run_hooks(hooks, jobs=2)
+    run_hooks(hooks, jobs=2)
+
+    assert sorted((tmp_path / "runs.txt").read_text().split()) == ["one", "two"]
+
+
+def test_failing_hooks_are_not_cached(tmp_path: Path) -> None:
+    cache = HookCache(tmp_path / "cache")
+    hook = make_hook("lint", "echo run >> runs.txt && false", inputs=["*.cfg"])
+    hook.working_path = tmp_path
+    hook.cache = cache
+
+    for _ in range(2):
+        with pytest.raises(HookError):
+            run_hooks([hook], jobs=1)
+
+    assert (tmp_path / "runs.txt").read_text() == "run\nrun\n"
+
+
+def bump_and_undo(test_repo: Path, *args: str) -> None:
+    run_tbump(
+        [
+            "-C",
+            str(test_repo),
+            "1.2.41-alpha-2",
+            "--non-interactive",
+            "--no-push",
+            *args,
+        ]
+    )
+    run_git(test_repo, "reset", "--hard", "HEAD~1")
+    run_git(test_repo, "tag", "--delete", "v1.2.41-alpha-2")
+
+
+def test_hook_cache_in_config(test_repo: Path) -> None:
+    cfg_path = test_repo / "tbump.toml"
+    parsed = tomlkit.loads(cfg_path.read_text())
+    parsed["performance"] = {"hook_cache_dir": "../hook-cache"}
+    cfg_path.write_text(tomlkit.dumps(parsed))
+    add_hook(test_repo, "count", "echo run >> ../runs.txt", inputs=["VERSION"])
+    runs = test_repo.parent / "runs.txt"
+
+    bump_and_undo(test_repo)
+    bump_and_undo(test_repo)
+    assert runs.read_text() == "run\n"
+    assert len(list((test_repo.parent / "hook-cache").iterdir())) == 1
+
+    bump_and_undo(test_repo, "--no-hook-cache")
+    assert runs.read_text() == "run\nrun\n"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_hook_timeout(tmp_path: Path, jobs: int) -> None:
+    # Run in a child shell, to check that the whole process group is stopped
+    hook = make_hook(
+        "slow", "sh -c 'sleep 30; touch done.txt'", timeout=0.5, parallel=True
+    )
+    hook.working_path = tmp_path
+
+    start = time.time()
+    with pytest.raises(HookTimeout) as e:
+        run_hooks([hook], jobs=jobs)
+
+    assert e.value.name == "slow"
+    assert time.time() - start < 20
+    assert not (tmp_path / "done.txt").exists()
+
+
+def interrupt_when_created(path: Path) -> None:
+    """Send SIGINT to this process, like Ctrl-C would, once `path` exists"""
+
+    def interrupt() -> None:
+        for _ in range(100):
+            if path.exists():
+                break
+            time.sleep(0.1)
+        os.kill(os.getpid(), signal.SIGINT)
+
+    threading.Thread(target=interrupt, daemon=True).start()
+
+
+# Starts, then only finishes if it is not stopped
+INTERRUPTED_CMD = "sh -c 'touch started.txt; sleep 3; touch done.txt'"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="uses POSIX signals")
+def test_interrupted_hook_with_timeout(tmp_path: Path) -> None:
+    hook = make_hook("slow", INTERRUPTED_CMD, timeout=30)
+    hook.working_path = tmp_path
+    interrupt_when_created(tmp_path / "started.txt")
+
+    with pytest.raises(KeyboardInterrupt):
+        run_hooks([hook], jobs=1)
+
+    # Leave enough time for the hook to finish, if it still runs
+    time.sleep(4)
+    assert not (tmp_path / "done.txt").exists()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="uses POSIX signals")
+def test_interrupted_parallel_hooks(tmp_path: Path) -> None:
+    hooks = [
+        make_hook("first", INTERRUPTED_CMD, parallel=True),
+        make_hook("second", "sleep 30", parallel=True),
+    ]
+    for hook in hooks:
+        hook.working_path = tmp_path
+    interrupt_when_created(tmp_path / "started.txt")
+
+    start = time.time()
+    with pytest.raises(KeyboardInterrupt):
+        run_hooks(hooks, jobs=2)
+
+    assert time.time() - start < 20
+    # Leave enough time for the first hook to finish, if it still runs
+    time.sleep(4)
+    assert not (tmp_path / "done.txt").exists()
+
+
+def test_timings_report(test_repo: Path, tmp_path: Path) -> None:
+    add_hook(test_repo, "quick", "true")
+    add_hook(test_repo, "crashing", "exit 3")
+    timings_path = tmp_path / "timings.json"
+
+    with pytest.raises(HookError):
+        # fmt: off
+        run_tbump(
+            [
+                "-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive",
+                "--timings", "--timings-json", str(timings_path),
+            ]
+        )
+        # fmt: on
+
+    # The report is written even when a hook fails
+    hooks = json.loads(timings_path.read_text())["hooks"]
+    assert [(x["name"], x["rc"], x["status"]) for x in hooks] == [
+        ("quick", 0, "ok"),
+        ("crashing", 3, "failed"),
+    ]
+    for hook in hooks:
+        assert hook["end"] - hook["start"] == pytest.approx(hook["duration"], abs=1e-3)
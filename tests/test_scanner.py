@@ -0,0 +1,64 @@
+import re
+from pathlib import Path
+
+from tbump.scanner import (
+    LineCounter,
+    iter_matching_lines,
+    map_file,
+    merge_replacements,
+    rewrite_file,
+    splice,
+)
+
+
+def test_find_lines_in_mapped_file(tmp_path: Path) -> None:
+    foo_txt = tmp_path / "foo.txt"
+    foo_txt.write_bytes(b"v=42\r\nfoo\nbar\nv=42 v=42\nv=42")
+
+    with map_file(foo_txt) as buf:
+        line_counter = LineCounter(buf)
+        found = [
+            (line_counter.lineno(start), buf[start:end])
+            for start, end in iter_matching_lines(buf, re.compile(b"42"))
+        ]
+
+    assert found == [(0, b"v=42"), (3, b"v=42 v=42"), (4, b"v=42")]
+
+
+def test_line_counter_in_any_order() -> None:
+    buf = b"a\nb\nc\nd\n"
+    line_counter = LineCounter(buf)
+    assert line_counter.lineno(6) == 3
+    assert line_counter.lineno(2) == 1
+    assert line_counter.lineno(4) == 2
+    assert line_counter.lineno(0) == 0
+
+
+def test_rewrite_file(tmp_path: Path) -> None:
+    foo_txt = tmp_path / "foo.txt"
+    foo_txt.write_bytes(b"v=42\r\nfoo\nv=42")
+
+    rewrite_file(foo_txt, [(0, 4, b"v=43"), (10, 14, b"v=43")])
+
+    assert foo_txt.read_bytes() == b"v=43\r\nfoo\nv=43"
+    assert [x.name for x in tmp_path.iterdir()] == ["foo.txt"]
+
+
+def test_merge_replacements() -> None:
+    replacements = [
+        (10, 15, b"1.3.0"),
+        (10, 13, b"1.3"),
+        (20, 23, b"1.3"),
+        (20, 23, b"1.4"),
+        (0, 3, b"1.3"),
+    ]
+    assert merge_replacements(replacements) == [
+        (0, 3, b"1.3"),
+        (10, 15, b"1.3.0"),
+        (20, 23, b"1.4"),
+    ]
+
+
+def test_splice() -> None:
+    buf = b"v=1.2.3 w=1.2"
+    assert splice(buf, [(2, 7, b"1.3.0"), (10, 13, b"1.3")]) == b"v=1.3.0 w=1.3"
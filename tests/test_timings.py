@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from tbump.cli import run as run_tbump
+from tbump.timings import TimingReport, count, get_report, phase, report_timings
+from tests.test_hooks import add_hook
+
+
+def test_nothing_recorded_by_default() -> None:
+    with phase("scan files"):
+        count("files scanned")
+    assert get_report() is None
+
+
+def test_report_timings(tmp_path: Path) -> None:
+    timings_path = tmp_path / "timings.json"
+    with report_timings(display=False, path=timings_path):
+        report = get_report()
+        assert isinstance(report, TimingReport)
+        with phase("outer"):
+            with phase("inner"):
+                count("files scanned", 2)
+    assert get_report() is None
+
+    res = json.loads(timings_path.read_text())
+    assert [x["name"] for x in res["phases"]] == ["outer", "inner"]
+    assert res["counters"]["files scanned"] == 2
+
+
+def test_timings_phases(test_repo: Path, tmp_path: Path) -> None:
+    add_hook(test_repo, "quick", "true")
+    timings_path = tmp_path / "timings.json"
+
+    # fmt: off
+    run_tbump(
+        [
+            "-C", str(test_repo), "1.2.41-alpha-2", "--non-interactive",
+            "--no-push", "--timings-json", str(timings_path),
+        ]
+    )
+    # fmt: on
+
+    report = json.loads(timings_path.read_text())
+    phases = [x["name"] for x in report["phases"]]
+    for name in [
+        "load config",
+        "check version",
+        "git checks",
+        "expand globs",
+        "scan files",
+        "apply patches",
+    ]:
+        assert name in phases
+    assert "git commit --message Bump to 1.2.41-alpha-2" in phases
+    assert phases.index("git checks") < phases.index("scan files")
+    counters = report["counters"]
+    assert counters["files scanned"] > 0
+    assert counters["bytes read"] > 0
+    assert counters["lines examined"] >= counters["patches"] > 0
+    # At least git status, git commit, git tag and the hook
+    assert counters["subprocesses"] >= 4
+    assert report["peak_memory"] > 0
+    assert report["duration"] >= max(x["duration"] for x in report["phases"])